@@ -1,3 +1,6 @@
 # flake8: noqa
 from . import strategy
-from .controller import Controller
+from .controller import Controller, load_market_data, market_series
+from .noise import NoiseModel
+from .oracle import Oracle
+from .strategy import Strategy
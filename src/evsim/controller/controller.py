@@ -1,31 +1,96 @@
 from datetime import datetime
 import logging
-from operator import attrgetter
-import random
+import numpy as np
+
+from evsim.data import SlotSeries, files, load, store
+from evsim.market import Market, MeritOrder, OrderBook
+from . import strategy as strategies
+from .noise import CAPACITY, MIN_CAPACITY, NoiseModel, random_seed
+
+
+def load_market_data(orderbook=False, merit_order=False):
+    """ Loads the fleet capacity, its minimum in 15-min periods and the markets
+    for the bidding strategies. With orderbook, the intraday market is built
+    from the individual trades and bids clear partially. With merit_order,
+    balancing bids are activated by the merit order of the tenders.
+    """
+    series = market_series()
+    return (
+        series["fleet_capacity"],
+        series["min_capacity"],
+        MeritOrder(load.balancing_tender_results(), load.activated_control_reserve())
+        if merit_order
+        else Market.from_series(series["balancing_prices"]),
+        OrderBook(load.intraday_trades())
+        if orderbook
+        else Market.from_series(series["intraday_prices"]),
+    )
+
+
+def market_series(rebuild=False):
+    """ Loads the fleet capacity, its 15-min minimum and the clearing prices
+    from the compiled store, compile again if needed.
+
+    The store is memory-mapped read-only, so any number of processes share
+    one physical copy of it and start without parsing the CSV files.
+    """
+    sources = [files.simulation_baseline, files.balancing_prices, files.intraday_prices]
+    if rebuild is True or store.outdated(files.store, sources):
+        df_baseline = load.simulation_baseline()
+        fleet_capacity = SlotSeries(
+            df_baseline["timestamp"], df_baseline["vpp_charging_power_kw"], 5 * 60
+        )
+        store.save(
+            files.store,
+            {
+                "fleet_capacity": fleet_capacity,
+                "min_capacity": fleet_capacity.rolling_min(3),
+                "balancing_prices": Market(load.balancing_prices()).prices,
+                "intraday_prices": Market(load.intraday_prices()).prices,
+            },
+        )
 
-from evsim.data import load
-from evsim.market import Market
+    return store.load(files.store)
 
 
 class Controller:
     def __init__(
-        self, cfg, strategy, accuracy=(100, 100), risk=(0, 0), imbalance_costs=1000
+        self,
+        cfg,
+        strategy,
+        accuracy=(100, 100),
+        risk=(0, 0),
+        imbalance_costs=1000,
+        data=None,
+        noise="uniform",
+        seed=None,
+        orderbook=False,
+        merit_order=False,
     ):
         self.logger = logging.getLogger(__name__)
 
         self.cfg = cfg
         self.account = Account()
+
+        # Simulated horizon, set when the simulation prepares the controller
+        self.horizon = None
         self.strategy = strategy
         self.accuracy = accuracy
 
+        # Distortion of the capacity predictions, see NoiseModel
+        self.noise_model = noise
+        self.seed = seed if seed is not None else random_seed()
+
+        # Intraday market with limited liquidity, see load_market_data()
+        self.orderbook = orderbook
+        self.merit_order = merit_order
+
         self.balancing_plan = ConsumptionPlan("Balancing")
         self.intraday_plan = ConsumptionPlan("Intraday")
 
-        # NOTE: When regular strategy no need for capacity and price data
-        if strategy.__name__ != "regular":
-            self.fleet_capacity = load.simulation_baseline()
-            self.balancing_market = Market(load.balancing_prices())
-            self.intraday_market = Market(load.intraday_prices())
+        # NOTE: When strategy without bids no need for capacity and price data
+        if self.strategy.bidding:
+            self.load_data(data)
 
         # Risk parameter set from outside, i.e. RL Agent
         self._risk = risk
@@ -36,6 +101,63 @@ class Controller:
         self.env = None
         self.vpp = None
 
+    def load_data(self, data=None):
+        """ Load the capacity and price data the bidding strategies rely on.
+        Data loaded before with load_market_data() can be shared instead.
+        """
+        if data is None:
+            data = load_market_data(self.orderbook, self.merit_order)
+
+        (
+            self.fleet_capacity,
+            self.min_capacity,
+            self.balancing_market,
+            self.intraday_market,
+        ) = data
+
+        self._init_noise()
+        self._prepare_strategy()
+
+    def set_noise(self, model, seed):
+        """ Distort the capacity predictions with another noise model and seed,
+        i.e. the ones of a restored snapshot.
+        """
+        self.noise_model = model
+        self.seed = seed
+        if self.strategy.bidding:
+            self._init_noise()
+
+    def _init_noise(self):
+        # NOTE: The 15-min minimum starts before the capacity, its grid covers both
+        self.noise = NoiseModel(
+            self.min_capacity.start,
+            self.min_capacity.step,
+            len(self.min_capacity),
+            self.noise_model,
+            self.seed,
+        )
+
+    def prepare(self, horizon):
+        """ Let the strategy precompute its tables for the simulated horizon
+        (first, last POSIX timestamp).
+        """
+        self.horizon = horizon
+        self._prepare_strategy()
+
+    def _prepare_strategy(self):
+        if (
+            self.horizon is None
+            or not self.strategy.bidding
+            or not hasattr(self, "min_capacity")
+        ):
+            return
+
+        self.strategy.prepare(
+            self.horizon,
+            (self.balancing_market, self.intraday_market),
+            self.min_capacity,
+        )
+
     def log(self, message, level=None):
         if level is None:
             level = self.logger.info
@@ -45,7 +167,7 @@ class Controller:
             % (
                 datetime.fromtimestamp(self.env.now),
                 type(self).__name__,
-                self.strategy.__name__,
+                self.strategy.name,
                 message,
             )
         )
@@ -56,6 +178,18 @@ class Controller:
     def warning(self, message):
         self.log(message, self.logger.warning)
 
+    @property
+    def strategy(self):
+        return self._strategy
+
+    @strategy.setter
+    def strategy(self, value):
+        """ Takes a Strategy or the name of a registered strategy."""
+        if isinstance(value, str):
+            value = strategies.get(value)
+        self._strategy = value
+        self._prepare_strategy()
+
     @property
     def accuracy(self):
         return self._accuracy
@@ -89,20 +223,43 @@ class Controller:
     def planned_kw(self, t):
         return self.balancing_plan.get(t) + self.intraday_plan.get(t)
 
+    def planned_kws(self, timeslots):
+        """ Vectorised planned_kw() for an array of timeslots."""
+        return self.balancing_plan.lookup(timeslots) + self.intraday_plan.lookup(
+            timeslots
+        )
+
+    def next_planned(self, timeslot):
+        """ Returns the next timeslot with a planned consumption."""
+        planned = [
+            self.balancing_plan.next(timeslot),
+            self.intraday_plan.next(timeslot),
+        ]
+        return min((t for t in planned if t is not None), default=None)
+
+    def next_decision(self, timeslot):
+        """ Returns the next timeslot at which the strategy can bid."""
+        if not self.strategy.bidding:
+            return None
+
+        # NOTE: Strategies only bid at 15-min market periods
+        return (timeslot // (15 * 60) + 1) * (15 * 60)
+
     def charge_fleet(self, timeslot):
         """ Perform a charging operation on the fleet for a given timeslot.
             Takes a a list of EVs as input and charges given its strategy.
         """
 
-        # 1. Sort according to charging priority
-        available_evs = sorted(
-            self.vpp.evs.values(), key=attrgetter("battery.level"), reverse=True
+        # 1. Sort according to charging priority, only the EVs the plans need
+        plan_evs = self.vpp.charging_order(
+            self._plan_evs(timeslot, self.balancing_plan)
+            + self._plan_evs(timeslot, self.intraday_plan)
         )
 
         # 2. Charge balancing
         vpp_charged_kwh, imbalance_kwh = 0, 0
         available_evs, charged, imbalance = self.charge_plan(
-            timeslot, available_evs, self.balancing_plan
+            timeslot, plan_evs, self.balancing_plan
         )
         vpp_charged_kwh += charged
         imbalance_kwh += imbalance
@@ -115,14 +272,14 @@ class Controller:
         imbalance_kwh += imbalance
 
         # 4. Charge remaining EVs regulary
-        self.log(
-            "Charging %d/%d EVs regulary." % (len(available_evs), len(self.vpp.evs))
-        )
+        # NOTE: The order does not matter, all of them are charged
+        available_evs = self.vpp.others(plan_evs[: len(plan_evs) - len(available_evs)])
+        self.log("Charging %d/%d EVs regulary." % (len(available_evs), len(self.vpp)))
         self.dispatch(available_evs)
         regular_charged_kwh = self._evs_to_kwh(len(available_evs))
 
         # 5. Execute Bidding strategy
-        profit = self.strategy(self, timeslot, self.risk, self.accuracy)
+        profit = self.strategy.bid(self, timeslot, self.risk, self.accuracy)
 
         # 6. Account for cost and profits
         imbalance_eur = imbalance_kwh * self.imbalance_costs
@@ -140,7 +297,7 @@ class Controller:
         """ Charge according to a predifined consumption plan"""
 
         planned_kw = plan.pop(timeslot)
-        num_plan_evs = int(planned_kw // self.cfg.charging_power)
+        num_plan_evs = self._plan_evs(timeslot, plan, planned_kw)
         self.log(
             "Consumption plan (%s): %.2fkWh, required EVs: %d."
             % (plan.name, planned_kw * (15 / 60), num_plan_evs)
@@ -165,7 +322,7 @@ class Controller:
         plan_evs = available_evs[:num_plan_evs]
         self.log(
             "Charging %d/%d EVs from %s plan."
-            % (len(plan_evs), len(self.vpp.evs), plan.name)
+            % (len(plan_evs), len(self.vpp), plan.name)
         )
         self.dispatch(plan_evs)
         charged_kwh = self._evs_to_kwh(len(plan_evs))
@@ -173,48 +330,48 @@ class Controller:
         rest_evs = available_evs[num_plan_evs:]
         return rest_evs, charged_kwh, imbalance_kwh
 
+    def _plan_evs(self, timeslot, plan, planned_kw=None):
+        """ Returns the number of EVs required by a plan at a timeslot."""
+        if planned_kw is None:
+            planned_kw = plan.get(timeslot)
+        return int(planned_kw // self.cfg.charging_power)
+
     def dispatch(self, evs):
         """Dispatches EVs to charging"""
-        for ev in evs:
-            ev.action = ev.charge_timestep()
+        self.vpp.dispatch(evs)
 
     def predict_capacity(self, timeslot, accuracy=100):
         """ Predict the available capacity for a given 5min timeslot.
-        Takes a dataframe and timeslot (POSIX timestamp) as input.
+        Takes a timeslot (POSIX timestamp) as input.
         Returns the predicted fleet capacity in kW.
         """
-        df = self.fleet_capacity
-        try:
-
-            # NOTE: Simple uniform distortion.
-            # Improve by gaussian with mean = accuracy
-            range = 1 - (accuracy / 100)
-            distortion = random.uniform(1 - range, 1 + range)  # e.g. [0.9, 1.1]
-            cap = df.loc[df["timestamp"] == timeslot, "vpp_charging_power_kw"].iat[0]
-            return cap * distortion
-        except IndexError:
+        cap = self.fleet_capacity.get(timeslot)
+        if cap is None:
             raise ValueError(
                 "Capacity prediction failed: %s is not in data."
                 % datetime.fromtimestamp(timeslot)
             )
+        return cap * self.noise.get(timeslot, accuracy, CAPACITY)
+
+    def predict_capacities(self, timeslots, accuracy=100):
+        """ Vectorised predict_capacity() for an array of 5min timeslots.
+        Returns the predicted fleet capacities in kW, NaN if not in data.
+        """
+        caps, _ = self.fleet_capacity.lookup(timeslots)
+        return caps * self.noise.lookup(timeslots, accuracy, CAPACITY)
 
     def predict_min_capacity(self, timeslot, accuracy=100):
         """ Predict the minimum available capacity for a given 15min timeslot.
-        Takes a dataframe and timeslot (POSIX timestamp) as input.
+        Takes a timeslot (POSIX timestamp) as input.
         Returns the predicted fleet capacity in kW.
         """
-        cap = float("inf")
-        for t in [0, 5, 10]:
-            try:
-                cap = min(cap, self.predict_capacity(timeslot + (60 * t), accuracy))
-            except ValueError:
-                pass
-
-        if cap == float("inf"):
+        cap = self.min_capacity.get(timeslot)
+        if cap is None:
             raise ValueError(
                 "Capacity prediction failed: 15 min timeslot %s is not in data."
                 % datetime.fromtimestamp(timeslot)
             )
+        cap = cap * self.noise.get(timeslot, accuracy, MIN_CAPACITY)
 
         self.log(
             "Predicted %.2fkw available charging power at %s with %d%% accuracy."
@@ -222,31 +379,195 @@ class Controller:
         )
         return cap
 
+    def predict_min_capacities(self, timeslots, accuracy=100):
+        """ Vectorised predict_min_capacity() for an array of 15min timeslots.
+        Returns the predicted fleet capacities in kW, NaN if not in data.
+        """
+        caps, _ = self.min_capacity.lookup(timeslots)
+        return caps * self.noise.lookup(timeslots, accuracy, MIN_CAPACITY)
+
     def _evs_to_kwh(self, nb_evs):
         return (nb_evs * self.cfg.charging_power) * (15 / 60)
 
 
 class ConsumptionPlan:
-    def __init__(self, name):
+    """ Planned consumption in kW per timeslot.
+
+    The plan is a ring buffer of timeslots, starting at the simulation clock:
+    A timeslot is stored at its offset from the clock. When the clock advances
+    with pop(), the slots passed are purged, so memory stays flat on long runs.
+    The buffer grows to fit the furthest planned timeslot.
+
+    Strategies planning in batches keep the last market period they planned
+    as the horizon of the plan.
+    """
+
+    def __init__(self, name, step=5 * 60, size=8 * 24 * 12):
         self.name = name
-        self.plan = dict()
+        self.step = step
+        self.horizon = None
+
+        # Timestamp of the slot at the head of the buffer, set by the first use
+        self.start = None
+        self.head = 0
+        self.kw = np.zeros(size)
+        self.planned = np.zeros(size, dtype=bool)
 
     def __repr__(self):
-        return repr((self.plan))
+        return repr(self.to_dict())
 
     def add(self, timestamp, capacity):
-        if timestamp in self.plan:
+        if self.start is None:
+            self.start = timestamp
+
+        k, r = divmod(timestamp - self.start, self.step)
+        if r != 0 or k < 0:
+            raise ValueError(
+                "%s is not a future timeslot of the consumption plan"
+                % datetime.fromtimestamp(timestamp)
+            )
+        if k >= len(self.kw):
+            self._grow(k + 1)
+
+        i = (self.head + k) % len(self.kw)
+        if self.planned[i]:
             raise ValueError(
                 "%s was already in consumption plan" % datetime.fromtimestamp(timestamp)
             )
 
-        self.plan[timestamp] = capacity
+        self.kw[i] = capacity
+        self.planned[i] = True
 
     def get(self, timestamp):
-        return self.plan.get(timestamp, 0)
+        i = self._index(timestamp)
+        if i is None:
+            return 0
+
+        return self.kw[i]
+
+    def lookup(self, timestamps):
+        """ Vectorised get() for an array of timestamps."""
+        capacities = np.zeros(len(timestamps))
+        if self.start is None:
+            return capacities
+
+        k, r = np.divmod(np.asarray(timestamps, dtype=np.int64) - self.start, self.step)
+        stored = (r == 0) & (k >= 0) & (k < len(self.kw))
+        capacities[stored] = self.kw[(self.head + k[stored]) % len(self.kw)]
+        return capacities
 
     def pop(self, timestamp):
-        return self.plan.pop(timestamp, 0)
+        """ Advance the clock to a timeslot and take its planned capacity."""
+        self.advance(timestamp)
+
+        i = self._index(timestamp)
+        if i is None:
+            return 0
+
+        capacity = self.kw[i]
+        self.kw[i] = 0
+        self.planned[i] = False
+        return capacity
+
+    def advance(self, timestamp):
+        """ Purge all slots before a timestamp."""
+        if self.start is None:
+            self.start = timestamp
+            return
+
+        k = (timestamp - self.start) // self.step
+        if k <= 0:
+            return
+
+        size = len(self.kw)
+        passed = (self.head + np.arange(min(k, size))) % size
+        self.kw[passed] = 0
+        self.planned[passed] = False
+
+        self.head = (self.head + k) % size
+        self.start += k * self.step
+
+    def window(self, timestamp, n):
+        """ Returns the planned capacities of n timeslots from a timestamp."""
+        window = np.zeros(n)
+        if self.start is None:
+            return window
+
+        k, r = divmod(timestamp - self.start, self.step)
+        if r != 0:
+            raise ValueError(
+                "%s is not a timeslot of the consumption plan"
+                % datetime.fromtimestamp(timestamp)
+            )
+
+        offsets = k + np.arange(n)
+        stored = (offsets >= 0) & (offsets < len(self.kw))
+        window[stored] = self.kw[(self.head + offsets[stored]) % len(self.kw)]
+        return window
+
+    def total(self, timestamp, n):
+        """ Returns the total planned capacity of n timeslots from a timestamp."""
+        return self.window(timestamp, n).sum()
+
+    def next(self, timestamp):
+        """ Returns the next timestamp with planned capacity."""
+        if self.start is None:
+            return None
+
+        offsets = (np.flatnonzero(self.kw) - self.head) % len(self.kw)
+        timestamps = self.start + offsets * self.step
+        timestamps = timestamps[timestamps > timestamp]
+        if len(timestamps) == 0:
+            return None
+
+        return int(timestamps.min())
+
+    def to_dict(self):
+        """ Returns the planned capacity by timestamp."""
+        if self.start is None:
+            return dict()
+
+        offsets = (np.flatnonzero(self.planned) - self.head) % len(self.kw)
+        offsets.sort()
+        indices = (self.head + offsets) % len(self.kw)
+        return {
+            self.start + int(k) * self.step: self.kw[i]
+            for k, i in zip(offsets, indices)
+        }
+
+    def snapshot(self):
+        return {"start": self.start, "horizon": self.horizon, "plan": self.to_dict()}
+
+    def restore(self, state):
+        self.start = state["start"]
+        self.horizon = state.get("horizon")
+        self.head = 0
+        self.kw[:] = 0
+        self.planned[:] = False
+        for timestamp, capacity in state["plan"].items():
+            self.add(timestamp, capacity)
+
+    def _index(self, timestamp):
+        """ Returns the buffer index of a timestamp, None if not stored."""
+        if self.start is None:
+            return None
+
+        k, r = divmod(timestamp - self.start, self.step)
+        if r != 0 or k < 0 or k >= len(self.kw):
+            return None
+
+        return (self.head + k) % len(self.kw)
+
+    def _grow(self, size):
+        """ Grow the buffer to fit at least size slots, head first."""
+        size = max(size, 2 * len(self.kw))
+        kw = np.zeros(size)
+        planned = np.zeros(size, dtype=bool)
+
+        n = len(self.kw)
+        kw[:n] = np.roll(self.kw, -self.head)
+        planned[:n] = np.roll(self.planned, -self.head)
+        self.kw, self.planned, self.head = kw, planned, 0
 
 
 class Account:
@@ -269,6 +590,12 @@ class Account:
         self.lost_rental_eur += price
         self.lost_rental_nb += 1
 
+    def snapshot(self):
+        return dict(vars(self))
+
+    def restore(self, state):
+        vars(self).update(state)
+
     def lost_rental_reset(self):
         self.lost_rental_eur = 0
         self.lost_rental_nb = 0
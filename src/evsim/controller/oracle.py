@@ -0,0 +1,75 @@
+import numpy as np
+
+# Market of a period in the allocation
+NONE = 0
+BALANCING = 1
+INTRADAY = 2
+
+
+class Oracle:
+    """ Perfect-foresight allocation of the fleet capacity to the markets.
+
+    With known clearing prices and baseline capacity, the profit of every
+    15-min market period only depends on the market the capacity is bought
+    from, so the allocation over the whole horizon is solved at once: The
+    predicted minimum capacity of a period is bought from the cheaper market,
+    if it is cheaper than the industry tariff. This is the optimum of the
+    linear program max sum (tariff - price) * quantity over both markets,
+    subject to the quantities not exceeding the capacity.
+
+    The allocation is an upper bound of the profits of the bidding
+    strategies, apart from the imbalances caused by EVs that are available in
+    the baseline, but not in the simulation.
+    """
+
+    def __init__(self, min_capacity, balancing_market, intraday_market, tariff):
+        self.step = 15 * 60
+        self.tariff = tariff
+
+        # Market periods covered by the capacity
+        first = -(-min_capacity.start // self.step) * self.step
+        last = min_capacity.start + (len(min_capacity) - 1) * min_capacity.step
+        self.start = first
+        self.timeslots = np.arange(first, last + 1, self.step, dtype=np.int64)
+
+        capacity, _ = min_capacity.lookup(self.timeslots)
+        self.balancing_prices = balancing_market.clearing_prices(self.timeslots)
+        self.intraday_prices = intraday_market.clearing_prices(self.timeslots)
+        self.market, self.quantity, self.profit = self.solve(
+            capacity, self.balancing_prices, self.intraday_prices, tariff
+        )
+
+    def __len__(self):
+        return len(self.timeslots)
+
+    @staticmethod
+    def solve(capacity, balancing_prices, intraday_prices, tariff):
+        """ Returns the market, quantity in kW and profit in EUR of every
+        period. Missing prices or capacities are never bought.
+        """
+        capacity = np.nan_to_num(np.maximum(capacity, 0))
+        pb = np.where(np.isnan(balancing_prices), np.inf, balancing_prices)
+        pi = np.where(np.isnan(intraday_prices), np.inf, intraday_prices)
+
+        # NOTE: Balancing on equal prices, like the integrated strategy
+        price = np.minimum(pb, pi)
+        market = np.where(pb <= pi, BALANCING, INTRADAY)
+
+        buy = (price < tariff) & (capacity > 0)
+        market = np.where(buy, market, NONE)
+        quantity = np.where(buy, capacity, 0)
+        # NOTE: Only where bought, missing prices are infinite
+        profit = np.zeros(len(price))
+        profit[buy] = (quantity[buy] * (15 / 60) / 1000) * (tariff - price[buy])
+        return market, quantity, profit
+
+    def get(self, timestamp):
+        """ Returns the market of a 15-min period, NONE if not in the horizon."""
+        i, r = divmod(timestamp - self.start, self.step)
+        if r != 0 or i < 0 or i >= len(self.market):
+            return NONE
+
+        return self.market[i]
+
+    def total_profit(self):
+        return self.profit.sum()
@@ -1,96 +1,442 @@
 from datetime import datetime
+import logging
+import numpy as np
+
 from evsim.market import Bid
+from .oracle import BALANCING, INTRADAY, Oracle
+
+logger = logging.getLogger(__name__)
 
 minute = 60
 hour = minute * 60
 day = hour * 24
 week = day * 7
 
+# Entry point group of strategies shipped by other packages
+ENTRY_POINTS = "evsim.strategies"
+
+# Strategy classes by name
+_registry = dict()
+_entry_points_loaded = False
+
+
+def register(cls):
+    """ Register a strategy class under its name, usable as class decorator."""
+    _registry[cls.name] = cls
+    return cls
+
+
+def get(name):
+    """ Returns a new instance of the strategy registered under a name."""
+    _load_entry_points()
+    if name not in _registry:
+        raise ValueError("Unknown charging strategy: %s" % name)
+
+    strategy = _registry[name]()
+    strategy.name = name
+    return strategy
+
+
+def names():
+    """ Returns the names of all registered strategies."""
+    _load_entry_points()
+    return list(_registry)
+
+
+def _load_entry_points():
+    """ Register the strategies of other packages, found by their entry points
+    in the evsim.strategies group, e.g. in setup.py:
+
+        entry_points={"evsim.strategies": ["fast = fleet.strategies:Fast"]}
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+
+    import pkg_resources
+
+    for ep in pkg_resources.iter_entry_points(ENTRY_POINTS):
+        try:
+            _registry[ep.name] = ep.load()
+        except Exception as e:
+            logger.warning("Loading charging strategy %s failed: %s" % (ep.name, e))
+
+
+class Strategy:
+    """ Bidding strategy of the controller.
+
+    A strategy is created for every controller, so it can keep state over a
+    run. Before the run, prepare() is called with the simulated horizon, the
+    markets and the capacity, to precompute per-run tables. In every timeslot
+    the controller calls bid(), which returns the profit of the bids placed.
+    decide() bids for an array of timeslots at once.
+    """
+
+    name = None
+    # Strategies without bids need no market and capacity data
+    bidding = True
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, self.name)
+
+    def __call__(self, controller, timeslot, risk, accuracy):
+        return self.bid(controller, timeslot, risk, accuracy)
+
+    def prepare(self, horizon, markets, capacity):
+        """ Precompute tables for a run.
+
+        Takes the simulated horizon (first, last POSIX timestamp), the
+        (balancing, intraday) markets and the 15-min minimum fleet capacity
+        as input.
+        """
+        self.horizon = horizon
+        self.markets = markets
+        self.capacity = capacity
 
-def regular(controller, timeslot, risk, accuracy):
+    def bid(self, controller, timeslot, risk, accuracy):
+        """ Bid in a timeslot. Returns the profit in EUR."""
+        raise NotImplementedError
+
+    def decide(self, controller, timeslots, risk, accuracy):
+        """ Bid in an array of timeslots. Returns the profits per timeslot."""
+        return np.array(
+            [self.bid(controller, int(t), risk, accuracy) for t in timeslots]
+        )
+
+
+@register
+class Regular(Strategy):
     """ Charge all EVs at regular prices"""
-    return 0
 
+    name = "regular"
+    bidding = False
 
-def balancing(controller, timeslot, risk, accuracy):
-    """ Benchmark bidding strategy for balancing market only"""
+    def bid(self, controller, timeslot, risk, accuracy):
+        return 0
+
+    def decide(self, controller, timeslots, risk, accuracy):
+        return np.zeros(len(timeslots))
 
-    # Unpack parameter tuples (bal, intr)
-    r, _ = risk
-    acc, _ = accuracy
 
+class MarketStrategy(Strategy):
+    """ Bid the predicted available capacity at one market, a lead time
+    ahead. The risk and accuracy of the market are taken from the parameter
+    tuples (bal, intr) at its position.
+    """
+
+    market = None
+    position = None
+    leadtime = None
+
+    def bid(self, controller, timeslot, risk, accuracy, price=None):
+        """ Bid in a timeslot, at a known clearing price if given."""
+        market, plan = self.market_plan(controller)
+        return market_strategy(
+            controller,
+            market,
+            plan,
+            timeslot,
+            self.leadtime,
+            risk[self.position],
+            accuracy[self.position],
+            price,
+        )
+
+    def decide(self, controller, timeslots, risk, accuracy):
+        timeslots = np.asarray(timeslots, dtype=np.int64)
+        profits = np.zeros(len(timeslots))
+
+        # NOTE: Bidding only at 15-min market periods
+        bidding = (timeslots + self.leadtime) % (15 * minute) == 0
+        if bidding.any():
+            market, plan = self.market_plan(controller)
+            profits[bidding] = batch_market_strategy(
+                controller,
+                market,
+                plan,
+                timeslots[bidding] + self.leadtime,
+                risk[self.position],
+                accuracy[self.position],
+            )
+        return profits
+
+    def market_plan(self, controller):
+        if self.market == "balancing":
+            return controller.balancing_market, controller.balancing_plan
+        return controller.intraday_market, controller.intraday_plan
+
+
+@register
+class Balancing(MarketStrategy):
+    """ Benchmark bidding strategy for balancing market only"""
+
+    name = "balancing"
+    market = "balancing"
+    position = 0
     # NOTE: Bidding for 1 timeslot exactly 1 week ahead, not for whole week
     # 7 days lead time
     leadtime = week
-    return market_strategy(
-        controller,
-        controller.balancing_market,
-        controller.balancing_plan,
-        timeslot,
-        leadtime,
-        r,
-        acc,
-    )
 
 
-def intraday(controller, timeslot, risk, accuracy):
-    """ Benchmark bidding strategy for intraday market only"""
+@register
+class BalancingWeek(Balancing):
+    """ Benchmark bidding strategy for balancing market only, planning the
+    bids of a whole week at once like the weekly tender.
+
+    When the period one week ahead is not planned yet, all periods of the
+    following week are bid for in one batch. The profits of the week are
+    accounted at the time of planning.
+    """
+
+    name = "balancing_week"
+
+    def bid(self, controller, timeslot, risk, accuracy):
+        if int(timeslot / 60) % 15 != 0:
+            controller.log("Not a bidding period.")
+            return 0
 
-    # Unpack parameter tuples (bal, intr)
-    _, r = risk
-    _, acc = accuracy
+        plan = controller.balancing_plan
+        if plan.horizon is not None and timeslot + self.leadtime <= plan.horizon:
+            return 0
 
+        timeslots = timeslot + (15 * minute) * np.arange(week // (15 * minute))
+        profit = float(self.decide(controller, timeslots, risk, accuracy).sum())
+        plan.horizon = int(timeslots[-1] + self.leadtime)
+        return profit
+
+
+@register
+class Intraday(MarketStrategy):
+    """ Benchmark bidding strategy for intraday market only"""
+
+    name = "intraday"
+    market = "intraday"
+    position = 1
     # 30 minute lead time
     leadtime = 30 * minute
-    return market_strategy(
-        controller,
-        controller.intraday_market,
-        controller.intraday_plan,
-        timeslot,
-        leadtime,
-        r,
-        acc,
-    )
 
 
-def integrated(controller, timeslot, risk, accuracy):
+@register
+class Integrated(Strategy):
     """ Charge predicted available EVs according to an integrated strategy:
 
     1. Charge predicted amount from balancing one week ahead if
        cheaper than intraday one week
     2. Charge predicted rest from intraday 30-min ahead
 
+    The prices and their comparisons are precomputed for the horizon in a
+    MarketTable when prepared, so a timeslot reads a single row of it.
     """
-    if int(timeslot / 60) % 15 != 0:
-        controller.log("Not a bidding period.")
-        return 0
 
-    profit = 0
-    pb, pi = None, None
-    try:
-        pb = controller.balancing_market.clearing_price(timeslot + week)
-    except ValueError as e:
-        controller.warning(e)
-    try:
-        pi = controller.intraday_market.clearing_price(timeslot + week)
-    except ValueError as e:
-        controller.warning(e)
+    name = "integrated"
 
-    # Only buy from balancing if cheaper than intraday
-    if pb and pi and (pb >= pi):
-        controller.log(
-            "Not bidding at balancing market for %s. Intraday price cheaper!"
-            % datetime.fromtimestamp(timeslot)
+    def __init__(self):
+        self.balancing = Balancing()
+        self.intraday = Intraday()
+        self.table = None
+
+    def prepare(self, horizon, markets, capacity):
+        super().prepare(horizon, markets, capacity)
+        self.balancing.prepare(horizon, markets, capacity)
+        self.intraday.prepare(horizon, markets, capacity)
+        self.table = MarketTable(
+            horizon, markets, self.balancing.leadtime, self.intraday.leadtime
         )
-    elif pb:
-        profit += balancing(controller, timeslot, risk, accuracy)
 
-    # Always buy (rest) from intraday
-    profit += intraday(controller, timeslot, risk, accuracy)
-    return profit
+    def bid(self, controller, timeslot, risk, accuracy):
+        if int(timeslot / 60) % 15 != 0:
+            controller.log("Not a bidding period.")
+            return 0
+
+        i = None
+        if self.table is not None:
+            i = self.table.row(timeslot, controller.cfg.industry_tariff)
+        if i is None:
+            return self.bid_lookup(controller, timeslot, risk, accuracy)
+
+        profit = 0
+        table = self.table
+
+        # Only buy from balancing if cheaper than intraday
+        if not table.balancing_available[i]:
+            controller.warning(
+                "Not bidding at balancing market for %s. No clearing price!"
+                % datetime.fromtimestamp(timeslot)
+            )
+        elif table.intraday_cheaper[i]:
+            controller.log(
+                "Not bidding at balancing market for %s. Intraday price cheaper!"
+                % datetime.fromtimestamp(timeslot)
+            )
+        elif table.balancing_tariff_cheaper[i]:
+            controller.log(
+                "The industry tariff is cheaper (%.2f > %.2f)"
+                % (table.balancing_prices[i], controller.cfg.industry_tariff)
+            )
+        else:
+            profit += self.balancing.bid(
+                controller, timeslot, risk, accuracy, table.balancing_prices[i]
+            )
+
+        # Always buy (rest) from intraday
+        if table.intraday_tariff_cheaper[i]:
+            controller.log(
+                "The industry tariff is cheaper (%.2f > %.2f)"
+                % (table.intraday_prices[i], controller.cfg.industry_tariff)
+            )
+        else:
+            profit += self.intraday.bid(
+                controller, timeslot, risk, accuracy, table.intraday_prices[i]
+            )
+        return profit
+
+    def bid_lookup(self, controller, timeslot, risk, accuracy):
+        """ Bid looking up the prices, for timeslots outside the table."""
+        profit = 0
+        pb, pi = None, None
+        try:
+            pb = controller.balancing_market.clearing_price(timeslot + week)
+        except ValueError as e:
+            controller.warning(e)
+        try:
+            pi = controller.intraday_market.clearing_price(timeslot + week)
+        except ValueError as e:
+            controller.warning(e)
+
+        # Only buy from balancing if cheaper than intraday
+        if pb and pi and (pb >= pi):
+            controller.log(
+                "Not bidding at balancing market for %s. Intraday price cheaper!"
+                % datetime.fromtimestamp(timeslot)
+            )
+        elif pb:
+            profit += self.balancing.bid(controller, timeslot, risk, accuracy)
+
+        # Always buy (rest) from intraday
+        profit += self.intraday.bid(controller, timeslot, risk, accuracy)
+        return profit
+
+
+class MarketTable:
+    """ Clearing prices and their comparisons for every 15-min bidding
+    timeslot of a horizon, as used by the integrated strategy.
+
+    Row i holds the prices of the bidding timeslot timeslots[i]: The
+    balancing price and the intraday price to compare it to one week ahead,
+    and the intraday price at the intraday lead time. Missing prices are
+    NaN. The comparisons with the industry tariff are updated when the
+    tariff changes. The arrays can be used as observations as well.
+    """
+
+    step = 15 * minute
 
+    def __init__(self, horizon, markets, balancing_leadtime, intraday_leadtime):
+        first, last = horizon
+        first = -(-first // self.step) * self.step
+        self.start = first
+        self.timeslots = np.arange(first, last + 1, self.step, dtype=np.int64)
 
-def market_strategy(controller, market, plan, timeslot, leadtime, risk, accuracy):
+        balancing, intraday = markets
+        self.balancing_prices = balancing.clearing_prices(
+            self.timeslots + balancing_leadtime
+        )
+        # NOTE: Balancing is compared to intraday at the same period
+        self.intraday_week_prices = intraday.clearing_prices(
+            self.timeslots + balancing_leadtime
+        )
+        self.intraday_prices = intraday.clearing_prices(
+            self.timeslots + intraday_leadtime
+        )
+
+        self.balancing_available = ~np.isnan(self.balancing_prices)
+        self.intraday_cheaper = self.balancing_available & (
+            self.balancing_prices >= self.intraday_week_prices
+        )
+
+        self.tariff = None
+        self.balancing_tariff_cheaper = None
+        self.intraday_tariff_cheaper = None
+
+    def __len__(self):
+        return len(self.timeslots)
+
+    def compare(self, tariff):
+        """ Compare the prices with an industry tariff."""
+        self.tariff = tariff
+        self.balancing_tariff_cheaper = self.balancing_prices > tariff
+        self.intraday_tariff_cheaper = self.intraday_prices > tariff
+
+    def row(self, timeslot, tariff):
+        """ Returns the row of a bidding timeslot, None if not in the table."""
+        i, r = divmod(timeslot - self.start, self.step)
+        if r != 0 or i < 0 or i >= len(self.timeslots):
+            return None
+
+        if tariff != self.tariff:
+            self.compare(tariff)
+        return i
+
+
+@register
+class PerfectForesight(Strategy):
+    """ Perfect-foresight benchmark: Replays the allocation of the whole
+    horizon, solved with the known clearing prices and baseline capacity.
+    Bids at the lead times of the other strategies, without risk and with
+    accurate predictions.
+    """
+
+    name = "oracle"
+
+    def __init__(self):
+        self.balancing = Balancing()
+        self.intraday = Intraday()
+        self.allocation = None
+
+    def prepare(self, horizon, markets, capacity):
+        super().prepare(horizon, markets, capacity)
+        self.allocation = None
+
+    def solve(self, controller):
+        """ Returns the allocation of the horizon, solved once per tariff."""
+        tariff = controller.cfg.industry_tariff
+        if self.allocation is None or self.allocation.tariff != tariff:
+            self.allocation = Oracle(
+                controller.min_capacity,
+                controller.balancing_market,
+                controller.intraday_market,
+                tariff,
+            )
+            controller.log(
+                "Solved allocation of %d market periods: %d balancing, "
+                "%d intraday, %.2f EUR expected profit."
+                % (
+                    len(self.allocation),
+                    (self.allocation.market == BALANCING).sum(),
+                    (self.allocation.market == INTRADAY).sum(),
+                    self.allocation.total_profit(),
+                )
+            )
+        return self.allocation
+
+    def bid(self, controller, timeslot, risk, accuracy):
+        if int(timeslot / 60) % 15 != 0:
+            controller.log("Not a bidding period.")
+            return 0
+
+        allocation = self.solve(controller)
+
+        profit = 0
+        if allocation.get(timeslot + self.balancing.leadtime) == BALANCING:
+            profit += self.balancing.bid(controller, timeslot, (0, 0), (100, 100))
+        if allocation.get(timeslot + self.intraday.leadtime) == INTRADAY:
+            profit += self.intraday.bid(controller, timeslot, (0, 0), (100, 100))
+        return profit
+
+
+def market_strategy(
+    controller, market, plan, timeslot, leadtime, risk, accuracy, price=None
+):
     assert 0 <= risk and risk <= 1
 
     market_period = timeslot + leadtime
@@ -101,15 +447,21 @@ def market_strategy(controller, market, plan, timeslot, leadtime, risk, accuracy
         return 0
 
     if plan.get(market_period) != 0:
-        controller.log("Already bid for %s in %s"(market.__name__, mp_dt))
+        controller.log("Already bid for %s in %s plan" % (mp_dt, plan.name))
         return 0
 
-    # Predict clearing price
-    try:
-        cp = market.clearing_price(market_period)
-    except ValueError as e:
-        controller.warning("Not bidding: %s" % e)
+    # Predict clearing price, unless known
+    if price is None:
+        try:
+            cp = market.clearing_price(market_period)
+        except ValueError as e:
+            controller.warning("Not bidding: %s" % e)
+            return 0
+    elif np.isnan(price):
+        controller.warning("Not bidding: No clearing price for %s." % mp_dt)
         return 0
+    else:
+        cp = price
 
     if cp > controller.cfg.industry_tariff:
         controller.log(
@@ -135,9 +487,11 @@ def market_strategy(controller, market, plan, timeslot, leadtime, risk, accuracy
         "Bidding for %.2fkw charging power at %s. Evaluated risk %.2f%%"
         % (quantity, mp_dt, risk * 100)
     )
-    bid = Bid(market_period, cp, quantity)
-    successful = market.place_bid(bid)
-    if successful:
+    # NOTE: Bids can clear partially. Markets without limited volume accept
+    # any quantity, like before, also an empty or negative one.
+    accepted, cleared = market.place_bids([market_period], [cp], [quantity])
+    if accepted[0]:
+        bid = Bid(market_period, cp, float(cleared[0]))
         controller.log(
             "Bought %.2f kWh for %.2f EUR/MWh for 15-min timeslot %s"
             % (bid.quantity * (15 / 60), bid.price, mp_dt)
@@ -154,6 +508,70 @@ def market_strategy(controller, market, plan, timeslot, leadtime, risk, accuracy
     return profit
 
 
+def batch_market_strategy(controller, market, plan, market_periods, risk, accuracy):
+    """ Vectorised market_strategy() for an array of market periods.
+    Returns the profits per market period.
+    """
+    assert 0 <= risk and risk <= 1
+    tariff = controller.cfg.industry_tariff
+
+    # Predict clearing prices and available charging power
+    cp = market.clearing_prices(market_periods)
+    charging_power = controller.predict_min_capacities(market_periods, accuracy)
+
+    # Reduce quantity if already something bought and deduct risk factor
+    quantity = charging_power - controller.planned_kws(market_periods)
+    quantity = quantity * (1 - risk)
+
+    # NOTE: Periods without data, already bid for or where the industry
+    # tariff is cheaper are skipped, as well as empty quantities.
+    bidding = (
+        ~np.isnan(cp)
+        & ~np.isnan(quantity)
+        & (plan.lookup(market_periods) == 0)
+        & (cp <= tariff)
+        & (quantity > 0)
+    )
+    controller.log(
+        "Bidding at %d/%d periods from %s to %s. Evaluated risk %.2f%%"
+        % (
+            bidding.sum(),
+            len(market_periods),
+            datetime.fromtimestamp(market_periods[0]),
+            datetime.fromtimestamp(market_periods[-1]),
+            risk * 100,
+        )
+    )
+
+    # Actual Bidding, at the predicted clearing prices
+    accepted, cleared = market.place_bids(
+        market_periods[bidding], cp[bidding], quantity[bidding]
+    )
+    successful = np.zeros(len(market_periods), dtype=bool)
+    successful[bidding] = accepted
+    market_periods, cp, quantity = (
+        market_periods[successful],
+        cp[successful],
+        cleared[accepted],
+    )
+    controller.log(
+        "Bought %.2f kWh for %.2f EUR/MWh on average"
+        % (
+            quantity.sum() * (15 / 60),
+            np.average(cp, weights=quantity) if len(cp) else 0,
+        )
+    )
+
+    # Update consumption plan for control periods
+    for mp, q in zip(market_periods.tolist(), quantity.tolist()):
+        for t in [0, 5, 10]:
+            plan.add(mp + (60 * t), q)
+
+    profits = np.zeros(len(successful))
+    profits[successful] = np.round((quantity * (15 / 60) / 1000) * (tariff - cp), 2)
+    return profits
+
+
 def _bid_profit(bid, industry_tariff):
     # Quantity MWh * (cheaper tariff)
     profit = (bid.quantity * (15 / 60) / 1000) * (industry_tariff - bid.price)
@@ -1 +1,2 @@
 # flake8: noqa
+from .series import SlotSeries
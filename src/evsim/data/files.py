@@ -31,6 +31,9 @@ control_reserve = processed_data_dir / "activated_control_reserve.csv"
 processed_tender_results = processed_data_dir / "tender_results.csv"
 balancing_prices = processed_data_dir / "balancing_prices.csv"
 intraday_prices = processed_data_dir / "intraday_prices.csv"
+intraday_trades = processed_data_dir / "intraday_trades.csv"
+# compiled binary store of the capacity and price series
+store = processed_data_dir / "store"
 # simulation result file paths
 simulation_baseline = processed_data_dir / "sim-baseline.csv"
 
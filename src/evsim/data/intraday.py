@@ -5,14 +5,7 @@ logger = logging.getLogger(__name__)
 
 
 def calculate_clearing_prices(df):
-    time = df["product_time"].str.split("Q", expand=True)
-    df["delivery_date"] = pd.to_datetime(
-        df["delivery_date"].astype(str)
-        + " "
-        + time[0]
-        + ":"
-        + ((time[1].astype(int) - 1) * 15).astype(str)
-    )
+    df["delivery_date"] = _delivery_times(df)
 
     # Clearing price is the lowest conducted trade. Bidding above the clearing price
     # will always be sucessful
@@ -24,3 +17,33 @@ def calculate_clearing_prices(df):
     df = df.loc[:, ["delivery_date", "unit_price"]]
     df.columns = ["product_time", "clearing_price_mwh"]
     return df
+
+
+def process_trades(df):
+    """ Keep the price in EUR/MWh and the quantity in MW of every trade,
+    sorted by delivery period and price.
+    """
+    df = pd.DataFrame(
+        {
+            "product_time": _delivery_times(df),
+            # Transform to EUR/MWh
+            "price_mwh": df["unit_price"] / 100,
+            "quantity_mw": df["quantity"],
+        },
+        columns=["product_time", "price_mwh", "quantity_mw"],
+    )
+    return df.sort_values(["product_time", "price_mwh"]).reset_index(drop=True)
+
+
+def _delivery_times(df):
+    """ Start of the delivery periods, from the date and the product time,
+    e.g. 10Q3 is 10:30.
+    """
+    time = df["product_time"].str.split("Q", expand=True)
+    return pd.to_datetime(
+        df["delivery_date"].astype(str)
+        + " "
+        + time[0]
+        + ":"
+        + ((time[1].astype(int) - 1) * 15).astype(str)
+    )
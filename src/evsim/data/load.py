@@ -20,6 +20,7 @@ def rebuild(charging_speed=CHARGING_SPEED, ev_capacity=EV_CAPACITY, ev_range=EV_
     car2go_capacity(charging_speed, ev_capacity, ev_range, rebuild=True)
     balancing_prices(rebuild=True)
     intraday_prices(rebuild=True)
+    intraday_trades(rebuild=True)
 
 
 def simulation_baseline():
@@ -123,8 +124,26 @@ def intraday_prices(rebuild=False):
     )
 
 
-def balancing_prices(rebuild=False):
-    """Loads balancing prices, process again if needed"""
+def intraday_trades(rebuild=False):
+    """Loads the individual intraday trades, process again if needed"""
+    procom_q = files.processed_data_dir / "procom_Q.pkl"
+
+    if rebuild is True or not files.intraday_trades.is_file():
+        if not procom_q.is_file():
+            intraday_prices(rebuild=True)
+
+        logger.info("Processing %s..." % procom_q)
+        df = intraday.process_trades(pd.read_pickle(procom_q))
+        df.to_csv(files.intraday_trades, index=False)
+        logger.info("Wrote processed intraday trades to %s" % files.intraday_trades)
+
+    return pd.read_csv(
+        files.intraday_trades, parse_dates=[0], infer_datetime_format=True
+    )
+
+
+def balancing_tender_results(rebuild=False):
+    """Loads processed balancing tender results, process again if needed"""
 
     if rebuild is True or not files.processed_tender_results.is_file():
         df_results = pd.read_csv(
@@ -141,10 +160,14 @@ def balancing_prices(rebuild=False):
         logger.info(
             "Wrote processed tender results to %s" % files.processed_tender_results
         )
-    df_results = pd.read_csv(
+    return pd.read_csv(
         files.processed_tender_results, parse_dates=[0, 1], infer_datetime_format=True
     )
 
+
+def activated_control_reserve(rebuild=False):
+    """Loads processed activated control reserve, process again if needed"""
+
     if rebuild is True or not files.control_reserve.is_file():
         df_activated_srl = pd.read_csv(
             files.activated_balancing,
@@ -161,9 +184,16 @@ def balancing_prices(rebuild=False):
         logger.info(
             "Wrote processed activated control reserve to %s" % files.control_reserve
         )
-    df_activated_srl = pd.read_csv(files.control_reserve)
+    return pd.read_csv(files.control_reserve)
+
+
+def balancing_prices(rebuild=False):
+    """Loads balancing prices, process again if needed"""
 
     if rebuild is True or not files.balancing_prices.is_file():
+        df_results = balancing_tender_results(rebuild)
+        df_activated_srl = activated_control_reserve(rebuild)
+
         df = balancing.calculate_clearing_prices(df_results, df_activated_srl)
         df.to_csv(files.balancing_prices, index=False)
         logger.info(
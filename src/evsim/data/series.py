@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class SlotSeries:
+    """ Dense series of values at a fixed time step, e.g. 5-min timeslots.
+
+    Values are kept in one NumPy array from the first to the last timestamp,
+    so a lookup by POSIX timestamp is integer arithmetic and an array index.
+    Timestamps without data are masked. Timestamps off the time step grid of
+    the first one can not be looked up and are dropped.
+    """
+
+    def __init__(self, timestamps, values, step):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+
+        self.step = step
+        self.start = int(timestamps.min()) if len(timestamps) else 0
+        offsets = timestamps - self.start
+        length = int(offsets.max()) // step + 1 if len(timestamps) else 0
+
+        # NOTE: Keep the first value of duplicate timestamps
+        on_grid = offsets % step == 0
+        slots, first = np.unique(offsets[on_grid] // step, return_index=True)
+
+        self.values = np.full(length, np.nan)
+        self.values[slots] = values[on_grid][first]
+        self.mask = np.zeros(length, dtype=bool)
+        self.mask[slots] = True
+
+    @classmethod
+    def from_arrays(cls, start, step, values, mask):
+        """ Series of given values and mask, e.g. memory-mapped ones, without
+        copying them.
+        """
+        series = cls.__new__(cls)
+        series.start = start
+        series.step = step
+        series.values = values
+        series.mask = mask
+        return series
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, timestamp):
+        """ Returns the value at a timestamp, None if not in data."""
+        i, r = divmod(timestamp - self.start, self.step)
+        if r != 0 or i < 0 or i >= len(self.values) or not self.mask[i]:
+            return None
+
+        return self.values[i]
+
+    def lookup(self, timestamps):
+        """ Vectorised get() for an array of timestamps.
+        Returns the values (NaN if not in data) and the mask of found values.
+        """
+        i, r = np.divmod(np.asarray(timestamps, dtype=np.int64) - self.start, self.step)
+        found = (r == 0) & (i >= 0) & (i < len(self.values))
+        found[found] = self.mask[i[found]]
+
+        values = np.full(len(i), np.nan)
+        values[found] = self.values[i[found]]
+        return values, found
+
+    def rolling_min(self, n):
+        """ Returns the series of the minimum over the next n time steps,
+        ignoring missing values. Masked where all n values are missing.
+        """
+        inf = np.full(n - 1, np.inf)
+        values = np.concatenate([inf, np.where(self.mask, self.values, np.inf), inf])
+        minimum = np.min(
+            [values[k : k + len(self.values) + n - 1] for k in range(n)], axis=0
+        )
+
+        # NOTE: The series starts n - 1 steps earlier, these windows overlap
+        # the first value as well.
+        found = np.flatnonzero(minimum != np.inf)
+        start = self.start - (n - 1) * self.step
+        return SlotSeries(start + found * self.step, minimum[found], self.step)
@@ -0,0 +1,96 @@
+import json
+import logging
+import numpy as np
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+from .series import SlotSeries
+
+logger = logging.getLogger(__name__)
+
+# Index of the current version of the store
+INDEX = "index.json"
+
+
+def save(directory, series):
+    """ Compile series by name into a directory of binary NumPy files.
+
+    Every series is saved as its values and mask into a new version
+    directory, the start and step of all series into the index, which is
+    swapped in last. Readers thus see either the old or the new version as a
+    whole, and processes compiling at once never write to the same files.
+    The index keeps the version it replaced, the one replaced before is
+    removed. Versions never indexed, e.g. still compiling, are never removed.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    version = Path(tempfile.mkdtemp(prefix="v-", dir=directory))
+    # NOTE: Temporary files are private, the store is readable by all
+    os.chmod(version, 0o755)
+
+    meta = dict()
+    for name, s in series.items():
+        for suffix, array in [("values", s.values), ("mask", s.mask)]:
+            path = version / ("%s.%s.npy" % (name, suffix))
+            np.save(path, np.ascontiguousarray(array))
+        meta[name] = {"start": int(s.start), "step": int(s.step)}
+
+    previous, replaced = _versions(directory)
+    fd, tmp = tempfile.mkstemp(prefix=INDEX + ".", suffix=".tmp", dir=directory)
+    with os.fdopen(fd, "w") as f:
+        index = {"version": version.name, "previous": previous, "series": meta}
+        json.dump(index, f, indent=2)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, directory / INDEX)
+    logger.info("Compiled %d series to %s" % (len(series), version))
+
+    # NOTE: Readers may still open the replaced version, mapped files stay
+    # valid when removed.
+    if replaced is not None and replaced not in [version.name, previous]:
+        shutil.rmtree(directory / replaced, ignore_errors=True)
+
+
+def load(directory):
+    """ Returns the series by name of a store, memory-mapped read-only.
+    Processes loading the same store share one physical copy of the data.
+    """
+    with open(directory / INDEX) as f:
+        index = json.load(f)
+
+    version = directory / index["version"]
+    return {
+        name: SlotSeries.from_arrays(
+            m["start"],
+            m["step"],
+            np.load(version / ("%s.values.npy" % name), mmap_mode="r"),
+            np.load(version / ("%s.mask.npy" % name), mmap_mode="r"),
+        )
+        for name, m in index["series"].items()
+    }
+
+
+def _versions(directory):
+    """ Returns the current version of a store and the one it replaced, None
+    if there is none.
+    """
+    try:
+        with open(directory / INDEX) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+
+    return index.get("version"), index.get("previous")
+
+
+def outdated(directory, sources):
+    """ Returns if the store is missing or older than one of its sources.
+    Missing sources are no reason to compile again, the store can be used
+    without its raw data.
+    """
+    index = directory / INDEX
+    if not index.is_file():
+        return True
+
+    compiled = index.stat().st_mtime
+    return any(s.is_file() and s.stat().st_mtime > compiled for s in sources)
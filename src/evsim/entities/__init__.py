@@ -1,3 +1,5 @@
 # flake8: noqa
 from .ev import EV
+from .fleet import Fleet
+from .fleet_state import FleetState
 from .vpp import VPP
@@ -2,28 +2,53 @@ from datetime import datetime
 import logging
 import simpy
 
+from .fleet import soc_units
+
 
 class EV:
-    def __init__(self, env, vpp, name, soc, battery_capacity, charging_speed):
+    def __init__(self, env, fleet, vpp, name, soc, battery_capacity, charging_speed):
         self.logger = logging.getLogger(__name__)
 
         # Battery capacity in percent
         self.battery = simpy.Container(env, init=soc, capacity=100)
         self.env = env
         self.name = name
+        self.fleet = fleet
         self.vpp = vpp
         self.action = None
 
+        # Trip in progress: (end time, trip sequence number, trip data)
+        self.trip = None
+
         self.charging_step = self._charging_step(battery_capacity, charging_speed, 5)
 
-        self.available = True
-        self.charging = False
+        self._available = True
+        self._charging = False
 
+        self.fleet.add(self)
         self.log("Added to fleet!")
 
     def __repr__(self):
         return repr((self.name, round(self.battery.level, 1)))
 
+    @property
+    def available(self):
+        return self._available
+
+    @available.setter
+    def available(self, value):
+        self.fleet.available += value - self._available
+        self._available = value
+
+    @property
+    def charging(self):
+        return self._charging
+
+    @charging.setter
+    def charging(self, value):
+        self.fleet.charging += value - self._charging
+        self._charging = value
+
     def log(self, message, level=None):
         if level is None:
             level = self.logger.info
@@ -51,7 +76,7 @@ class EV:
     def charge_timestep(self):
         increment = min(self.charging_step, self.battery.capacity - self.battery.level)
         if increment > 0:
-            self.battery.put(increment)
+            self._put(increment)
         self.log("Charged battery for %.2f%%." % increment)
 
         # Remove EV after from VPP when battery too full
@@ -100,7 +125,28 @@ class EV:
         # NOTE: Arrive one second early, to be able to start again
         self.available = False
         self.charging = False
-        yield self.env.timeout((duration * 60) - 1)  # seconds
+        end = self.env.now + (duration * 60) - 1  # seconds
+        yield from self.finish_trip(
+            end, rental, duration, trip_charge, end_charger, trip_price, account
+        )
+
+    def finish_trip(
+        self, end, rental, duration, trip_charge, end_charger, trip_price, account
+    ):
+        """ Drive until the end of a started trip and park the EV."""
+        self.trip = (
+            end,
+            self.fleet.trips_started,
+            rental,
+            duration,
+            trip_charge,
+            end_charger,
+            trip_price,
+        )
+        self.fleet.trips_started += 1
+
+        yield self.env.timeout(end - self.env.now)
+        self.trip = None
         account.rental(trip_price)
         self.available = True
 
@@ -145,11 +191,11 @@ class EV:
             # Charged during the trip:  More than possible
             free_battery = self.battery.capacity - self.battery.level
             if free_battery > 0 and -trip_charge >= free_battery:
-                yield self.battery.put(self.battery.capacity - self.battery.level)
+                yield self._put(self.battery.capacity - self.battery.level)
                 self.log("Battery charged more than available space. Filled up to 100.")
             # Charged during the trip: Adjust level
             elif -trip_charge < free_battery:
-                yield self.battery.put(-trip_charge)
+                yield self._put(-trip_charge)
                 self.log("Battery level has been increased by %s%%." % -trip_charge)
             else:
                 self.log("Battery is still full")
@@ -158,9 +204,28 @@ class EV:
             self.log("No consumed charge!")
         # Normal SoC usage
         else:
-            yield self.battery.get(trip_charge)
+            yield self._get(trip_charge)
             self.log("Battery level has been decreased by %s%%." % trip_charge)
 
+    def _put(self, amount):
+        level = self.battery.level
+        event = self.battery.put(amount)
+        self._level_changed(level)
+        return event
+
+    def _get(self, amount):
+        level = self.battery.level
+        event = self.battery.get(amount)
+        self._level_changed(level)
+        return event
+
+    def _level_changed(self, previous_level):
+        """ Report a changed battery level to fleet and VPP aggregates"""
+        level = self.battery.level
+        self.fleet.soc += soc_units(level) - soc_units(previous_level)
+        if self.vpp.contains(self):
+            self.vpp.level_changed(self, previous_level, level)
+
     def _charging_step(self, battery_capacity, charging_speed, control_period):
         """ Returns the SoC increase given the control period in minutes """
 
@@ -0,0 +1,74 @@
+import numpy as np
+
+# NOTE: Running sums of battery levels are kept in fixed point, so that
+# adding and subtracting levels over a long simulation does not drift.
+SOC_UNITS = 10 ** 9
+
+
+def soc_units(level):
+    """ Battery level in fixed point units of the fleet SoC sum"""
+    return int(round(level * SOC_UNITS))
+
+
+def vpp_soc_units(level):
+    """ Battery level rounded to two decimals, in hundredths"""
+    return int(round(round(level, 2) * 100))
+
+
+def sum_soc_units(levels):
+    """ Vectorised sum of soc_units() over an array of battery levels"""
+    return int(np.rint(levels * SOC_UNITS).astype(np.int64).sum())
+
+
+def sum_vpp_soc_units(levels):
+    """ Vectorised sum of vpp_soc_units() over an array of battery levels"""
+    hundredths = levels * 100
+    units = np.rint(hundredths)
+
+    # NOTE: Only when the scaled level is exactly halfway between two
+    # hundredths, rint() may round differently than round(level, 2).
+    halfway = hundredths - np.floor(hundredths) == 0.5
+    units[halfway] = [vpp_soc_units(level) for level in levels[halfway]]
+    return int(units.astype(np.int64).sum())
+
+
+class Fleet:
+    """ All EVs of the fleet with running aggregates of their state.
+
+    EVs report their state transitions to the fleet, so that the fleet
+    statistics are read in O(1) instead of iterating over all EVs.
+    """
+
+    def __init__(self):
+        self.evs = dict()
+
+        self.soc = 0
+        self.available = 0
+        self.charging = 0
+
+        # Orders the trips in progress like their SimPy events
+        self.trips_started = 0
+
+    def __len__(self):
+        return len(self.evs)
+
+    def __contains__(self, name):
+        return name in self.evs
+
+    def __getitem__(self, name):
+        return self.evs[name]
+
+    def add(self, ev):
+        if ev.name in self.evs:
+            raise ValueError("'%s' is already part of the fleet." % ev.name)
+
+        self.evs[ev.name] = ev
+        self.soc += soc_units(ev.battery.level)
+        self.available += ev.available
+        self.charging += ev.charging
+
+    def avg_soc(self):
+        if len(self.evs) > 0:
+            return self.soc / SOC_UNITS / len(self.evs)
+        else:
+            return 0
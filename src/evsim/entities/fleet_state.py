@@ -0,0 +1,296 @@
+import copy
+from datetime import datetime
+import heapq
+import logging
+import numpy as np
+
+from .fleet import SOC_UNITS, sum_soc_units, sum_vpp_soc_units
+
+
+class FleetState:
+    """ Struct-of-arrays state of the whole EV fleet and its VPP.
+
+    Instead of one object with its own battery container and SimPy process per
+    EV, SoC, availability, charging and VPP membership of all EVs are kept in
+    NumPy arrays, indexed by the order in which EVs join the fleet. Trips in
+    progress are kept in a heap and finished at the next timeslot.
+
+    Towards the controller it behaves like the VPP: EVs are handed out as
+    index arrays, which are charged in one vectorised step.
+    """
+
+    def __init__(self, env, name, num_evs, battery_capacity, charging_power):
+        self.logger = logging.getLogger(__name__)
+
+        self.env = env
+        self.name = name
+        self.charging_power = charging_power
+        self.charging_step = self._charging_step(battery_capacity, charging_power, 5)
+
+        self.commited_capacity = 0
+
+        # EV names and their index in the state arrays
+        self.names = list()
+        self.ids = dict()
+
+        # Battery level in percent
+        self.soc = np.zeros(num_evs)
+        self.available = np.zeros(num_evs, dtype=bool)
+        self.charging = np.zeros(num_evs, dtype=bool)
+        self.vpp = np.zeros(num_evs, dtype=bool)
+        # Order in which EVs joined the VPP, breaks ties in the charging priority
+        self.vpp_order = np.zeros(num_evs, dtype=np.int64)
+        self.num_vpp = 0
+        self._num_added = 0
+
+        # Trips in progress: (end time, trip sequence number, trip data)
+        self.trips = list()
+        self._num_trips = 0
+
+    def __len__(self):
+        return self.num_vpp
+
+    def copy(self):
+        """ Returns a copy of the state, i.e. to finish trips ahead of time."""
+        state = copy.copy(self)
+        state.names = list(self.names)
+        state.ids = dict(self.ids)
+        state.soc = self.soc.copy()
+        state.available = self.available.copy()
+        state.charging = self.charging.copy()
+        state.vpp = self.vpp.copy()
+        state.vpp_order = self.vpp_order.copy()
+        state.trips = list(self.trips)
+        return state
+
+    def log(self, message, level=None):
+        if level is None:
+            level = self.logger.info
+
+        level(
+            "[%s] - %s(%.1fkW/%.1fkW) %s"
+            % (
+                datetime.fromtimestamp(self.env.now),
+                self.name,
+                self.capacity(),
+                self.commited_capacity,
+                message,
+            )
+        )
+
+    def error(self, message):
+        self.log(message, self.logger.error)
+
+    def add_ev(self, name, soc):
+        """ Add a new EV to the fleet, returns its index."""
+        if name in self.ids:
+            raise ValueError("'%s' is already part of the fleet." % name)
+
+        i = len(self.names)
+        self.names.append(name)
+        self.ids[name] = i
+        self.soc[i] = soc
+        self.available[i] = True
+        return i
+
+    def contains_ev(self, name):
+        return name in self.ids
+
+    # ---- Fleet statistics ----
+
+    def fleet_evs(self):
+        return len(self.names)
+
+    def fleet_soc(self):
+        if len(self.names) == 0:
+            return 0
+        soc = sum_soc_units(self.soc[: len(self.names)])
+        return soc / SOC_UNITS / len(self.names)
+
+    def fleet_available(self):
+        return int(self.available.sum())
+
+    def fleet_charging(self):
+        return int(self.charging.sum())
+
+    # ---- VPP ----
+
+    def add(self, i):
+        if self.vpp[i]:
+            raise ValueError("'%s' is already allocated to VPP." % self.names[i])
+
+        self.vpp[i] = True
+        self.vpp_order[i] = self._num_added
+        self._num_added += 1
+        self.num_vpp += 1
+
+    def remove(self, i):
+        if not self.vpp[i]:
+            raise ValueError("%s was not allocated to VPP." % self.names[i])
+
+        self.vpp[i] = False
+        self.num_vpp -= 1
+
+    def avg_soc(self):
+        if self.num_vpp > 0:
+            return sum_vpp_soc_units(self.soc[self.vpp]) / 100 / self.num_vpp
+        else:
+            return 0
+
+    def capacity(self):
+        return self.num_vpp * self.charging_power
+
+    def charging_order(self, n=None):
+        """ Returns the indices of the first n EVs (all if None) in the VPP
+        sorted by charging priority: Highest SoC first, ties in the order the
+        EVs joined the VPP.
+        """
+        members = np.flatnonzero(self.vpp)
+        order = np.lexsort((self.vpp_order[members], -self.soc[members]))
+        return members[order[:n]]
+
+    def others(self, evs):
+        """ Returns the indices of the EVs in the VPP except the given ones."""
+        members = self.vpp.copy()
+        members[evs] = False
+        return np.flatnonzero(members)
+
+    def dispatch(self, evs):
+        """ Charge the given EVs (index array) for one timestep."""
+        if len(evs) == 0:
+            return
+
+        soc = self.soc[evs]
+        increment = np.minimum(self.charging_step, 100 - soc)
+        self.soc[evs] = np.where(increment > 0, soc + increment, soc)
+
+        # Remove EVs from VPP when battery too full
+        full = evs[(100 - self.soc[evs] < self.charging_step) & self.vpp[evs]]
+        self.vpp[full] = False
+        self.num_vpp -= len(full)
+
+    # ---- Trips ----
+
+    def start_trip(self, trip, account):
+        """ Start a trip, equivalent to the first part of EV.drive()"""
+        i = self.ids[trip.EV]
+        trip_charge = trip.start_soc - trip.end_soc
+
+        # 1. Check if enough battery for trip left
+        if trip_charge > 0 and self.soc[i] < trip_charge:
+            self.error(
+                "%s: Not enough battery for the planned trip %d!"
+                % (trip.EV, trip.Index)
+            )
+            account.subtract(trip.trip_price)
+            account.lost_rental(trip.trip_price)
+            return
+
+        # 2. Refuse rental if other EVs in VPP can not substitute capacity
+        if self.vpp[i] and self.commited_capacity > self.capacity():
+            self.log(
+                "%s: Refusing rental! "
+                "EV is commited to VPP and no replacement EV is available." % trip.EV
+            )
+            account.subtract(trip.trip_price)
+            account.lost_rental(trip.trip_price)
+            return
+
+        # 3. Remove EV from VPP if allocated to it
+        if self.vpp[i]:
+            self.remove(i)
+
+        # 4. Drive for the trip duration
+        # NOTE: Arrive one second early, to be able to start again
+        self.available[i] = False
+        self.charging[i] = False
+        end = self.env.now + (trip.trip_duration * 60) - 1
+        self.resume_trip(
+            end,
+            i,
+            trip.Index,
+            trip.trip_duration,
+            trip_charge,
+            trip.end_charging,
+            trip.trip_price,
+        )
+
+    def resume_trip(
+        self, end, i, rental, duration, trip_charge, end_charger, trip_price
+    ):
+        """ Add a started trip, which is finished after its end time."""
+        heapq.heappush(
+            self.trips,
+            (
+                end,
+                self._num_trips,
+                i,
+                trip_charge,
+                end_charger,
+                trip_price,
+                rental,
+                duration,
+            ),
+        )
+        self._num_trips += 1
+
+    def pending_trips(self):
+        """ Returns the trips in progress in the order they are finished."""
+        return sorted(self.trips)
+
+    def next_trip_end(self):
+        """ Returns the end time of the next trip to finish."""
+        if not self.trips:
+            return None
+
+        return self.trips[0][0]
+
+    def end_trips(self, until, account):
+        """ Finish all trips that ended before a given timestamp, equivalent
+        to the second part of EV.drive().
+        """
+        ending = list()
+        while self.trips and self.trips[0][0] < until:
+            ending.append(heapq.heappop(self.trips))
+
+        # NOTE: Trips ending at the same time join the VPP in the same order as
+        # the SimPy processes would: Adjusting the SoC takes a simulation step
+        # unless the level stays the same.
+        ending.sort(key=lambda t: (t[0], self._adjusts_soc(t[2], t[3]), t[1]))
+
+        for _, _, i, trip_charge, end_charger, trip_price, _, _ in ending:
+            account.rental(trip_price)
+            self.available[i] = True
+            self._adjust_soc(i, trip_charge)
+
+            # Add to VPP when parked at charger
+            if end_charger == 1:
+                self.charging[i] = True
+
+                # Only add to VPP if enough battery capacity to charge next timeslot
+                if 100 - self.soc[i] >= self.charging_step:
+                    self.add(i)
+
+    def _adjusts_soc(self, i, trip_charge):
+        return trip_charge > 0 or (trip_charge < 0 and 100 - self.soc[i] > 0)
+
+    def _adjust_soc(self, i, trip_charge):
+        """ Adjusts the SoC according to the trip charge, see EV._adjust_soc()"""
+
+        # Special case: Battery has been charged without beeing at the charger
+        if trip_charge < 0:
+            free_battery = 100 - self.soc[i]
+            if free_battery > 0 and -trip_charge >= free_battery:
+                self.soc[i] += free_battery
+            elif -trip_charge < free_battery:
+                self.soc[i] += -trip_charge
+        # Normal SoC usage
+        elif trip_charge > 0:
+            self.soc[i] -= trip_charge
+
+    def _charging_step(self, battery_capacity, charging_speed, control_period):
+        """ Returns the SoC increase given the control period in minutes """
+
+        kwh_per_control_period = (charging_speed / 60) * control_period
+        soc_per_control_period = 100 * kwh_per_control_period / battery_capacity
+        return soc_per_control_period
@@ -1,18 +1,37 @@
+import bisect
 from datetime import datetime
+import itertools
 import logging
+import numpy as np
+
+from .fleet import sum_soc_units, sum_vpp_soc_units, vpp_soc_units
 
 
 class VPP:
-    def __init__(self, env, name, num_evs, charging_power):
+    def __init__(self, env, name, num_evs, charging_power, fleet):
         self.logger = logging.getLogger(__name__)
 
         self.env = env
         self.name = name
         self.charging_power = charging_power
+        # Fleet of all EVs, its aggregates are updated on dispatch
+        self.fleet = fleet
 
         self.evs = dict()
         self.commited_capacity = 0
 
+        # Sum of the rounded battery levels of the EVs in the VPP
+        self.soc = 0
+
+        # EVs sorted by charging priority: Highest SoC first, ties in the order
+        # the EVs joined the VPP. Entries are (-level, join number, EV).
+        self.priority = list()
+        self.keys = dict()
+        self._num_added = 0
+
+    def __len__(self):
+        return len(self.evs)
+
     def log(self, message):
         self.logger.info(
             "[%s] - %s(%.1fkW/%.1fkW) %s"
@@ -38,6 +57,9 @@ class VPP:
     def add(self, ev):
         if ev.name not in self.evs:
             self.evs[ev.name] = ev
+            self.soc += vpp_soc_units(ev.battery.level)
+            self._insert(ev, ev.battery.level, self._num_added)
+            self._num_added += 1
             self.log("Adding EV '%s' to VPP." % ev.name)
             self.log_EVs()
         else:
@@ -45,10 +67,65 @@ class VPP:
 
     def avg_soc(self):
         if len(self.evs) > 0:
-            return sum(self.socs()) / len(self.evs)
+            return self.soc / 100 / len(self.evs)
         else:
             return 0
 
+    def charging_order(self, n=None):
+        """ Returns the first n EVs (all if None) in the VPP sorted by charging
+        priority.
+        """
+        return [ev for _, _, ev in itertools.islice(self.priority, n)]
+
+    def others(self, evs):
+        """ Returns the EVs in the VPP except the given ones, in the order they
+        joined the VPP.
+        """
+        names = set(ev.name for ev in evs)
+        return [ev for name, ev in self.evs.items() if name not in names]
+
+    def dispatch(self, evs):
+        """ Charge the given EVs for one timestep, see EV.charge_timestep().
+
+        The new battery levels are computed in one vectorised step, fleet and
+        VPP aggregates are updated once for all EVs and the EVs too full to
+        charge another timestep are removed from the VPP in bulk.
+        """
+        if len(evs) == 0:
+            return
+
+        levels = np.array([ev.battery.level for ev in evs], dtype=np.float64)
+        steps = np.array([ev.charging_step for ev in evs])
+        increments = np.minimum(steps, 100 - levels)
+        charged = np.flatnonzero(increments > 0)
+        for i in charged:
+            evs[i].battery.put(float(increments[i]))
+
+        previous, levels = levels, levels.copy()
+        levels[charged] += increments[charged]
+        self.fleet.soc += sum_soc_units(levels) - sum_soc_units(previous)
+
+        members = np.array([ev.name in self.evs for ev in evs])
+        self.soc += sum_vpp_soc_units(levels[members])
+        self.soc -= sum_vpp_soc_units(previous[members])
+
+        # Move the dispatched EVs in the charging priority, remove EVs from
+        # VPP when battery too full
+        full = members & (100 - levels < steps)
+        for i in np.flatnonzero(members):
+            ev = evs[i]
+            joined = self._delete(ev)
+            if full[i]:
+                del self.evs[ev.name]
+                self.soc -= vpp_soc_units(levels[i])
+            else:
+                self._insert(ev, ev.battery.level, joined)
+
+        self.log(
+            "Charged %d EVs, removed %d EVs too full to charge."
+            % (len(charged), full.sum())
+        )
+
     def capacity(self):
         return len(self.evs) * self.charging_power
 
@@ -58,9 +135,31 @@ class VPP:
 
         return False
 
+    def level_changed(self, ev, previous_level, level):
+        """ Update SoC sum and charging priority when the battery level of an
+        EV in the VPP changed.
+        """
+        self.soc += vpp_soc_units(level) - vpp_soc_units(previous_level)
+        joined = self._delete(ev)
+        self._insert(ev, level, joined)
+
     def remove(self, ev):
         if ev.name in self.evs:
             del self.evs[ev.name]
+            self.soc -= vpp_soc_units(ev.battery.level)
+            self._delete(ev)
             self.log("Removed EV %s from VPP." % ev.name)
         else:
             raise ValueError("%s was not allocated to VPP." % ev.name)
+
+    def _insert(self, ev, level, joined):
+        key = (-level, joined, ev)
+        self.keys[ev.name] = key
+        bisect.insort(self.priority, key)
+
+    def _delete(self, ev):
+        """ Removes the EV from the priority list, returns its join number"""
+        # NOTE: Join numbers are unique, so the EVs are never compared
+        key = self.keys.pop(ev.name)
+        del self.priority[bisect.bisect_left(self.priority, key)]
+        return key[1]
@@ -4,7 +4,7 @@ from gym import spaces
 from gym.utils import seeding
 import numpy as np
 
-from evsim.controller import Controller, strategy
+from evsim.controller import Controller
 from evsim.simulation import Simulation, SimulationConfig
 
 
@@ -21,6 +21,9 @@ class FleetEnv(gym.Env):
         self.accuracy = (70, 90)
         self.init_sim()
 
+        # Episodes restart from the initial state of the simulation
+        self.warm_state = self.sim.snapshot()
+
         # Define what the agent can do:
         #    Set Risk factors from lambda = [0.0, 0.1, ..., 1.0]
         #    for both markets
@@ -44,7 +47,7 @@ class FleetEnv(gym.Env):
     def init_sim(self):
         cfg = SimulationConfig()
         self.controller = Controller(
-            cfg, strategy.integrated, accuracy=self.accuracy, imbalance_costs=8000
+            cfg, "integrated", accuracy=self.accuracy, imbalance_costs=8000
         )
         self.sim = Simulation(cfg, self.controller)
 
@@ -81,8 +84,12 @@ class FleetEnv(gym.Env):
         self.episode += 1
         self.curr_balance = 0
 
-        del self.sim
-        self.init_sim()
+        self.sim.restore(self.warm_state)
+        # Every episode predicts with other distortions
+        # NOTE: After the restore, which sets the noise of the warm state
+        self.controller.set_noise(
+            self.warm_state.noise_model, self.warm_state.seed + self.episode
+        )
 
         self._realtime = self.sim.env.now
         ob = self.realtime.hour
@@ -1,12 +1,24 @@
 import click
 from datetime import datetime
 import logging
+import numpy as np
 import os
 import time
 
-from evsim.controller import Controller, strategy
+from evsim.controller import Controller, NoiseModel, market_series, strategy
 from evsim.data import load
-from evsim.simulation import Simulation, SimulationConfig
+from evsim.market import Bid
+from evsim.simulation import (
+    ENGINES,
+    ChunkWriter,
+    SimulationConfig,
+    Snapshot,
+    divergence,
+    engine_class,
+    grid,
+    partition,
+    sweep,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -76,7 +88,7 @@ def cli(ctx, debug, name, logs):
 )
 @click.option(
     "--charging-strategy",
-    type=click.Choice(["regular", "balancing", "intraday", "integrated"]),
+    type=click.Choice(strategy.names()),
     default="regular",
     help="Charging strategy",
     show_default=True,
@@ -97,9 +109,115 @@ def cli(ctx, debug, name, logs):
     default=(0.0, 0.0),
     show_default=True,
 )
+@click.option(
+    "--noise",
+    type=click.Choice(NoiseModel.models),
+    default="uniform",
+    help="Error model of the capacity predictions.",
+    show_default=True,
+)
+@click.option(
+    "--seed",
+    type=int,
+    help="Seed of the prediction errors.  [default: random]",
+)
+@click.option(
+    "--orderbook/--no-orderbook",
+    default=False,
+    help="Clear intraday bids partially against the traded volume.",
+)
+@click.option(
+    "--merit-order/--no-merit-order",
+    default=False,
+    help="Activate balancing bids via the merit order of the tenders.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(list(ENGINES)),
+    default="simpy",
+    help=(
+        "Simulation engine, vectorized keeps the fleet state in arrays, "
+        "event additionally skips idle timeslots."
+    ),
+    show_default=True,
+)
+@click.option(
+    "--chunk-size",
+    type=int,
+    default=0,
+    help=(
+        "Stream stats and results to disk in chunks of this many timeslots, "
+        "0 keeps them in memory until the end."
+    ),
+    show_default=True,
+)
+@click.option(
+    "--chunk-format",
+    type=click.Choice(ChunkWriter.formats),
+    default="csv.gz",
+    help="File format of the streamed chunks.",
+    show_default=True,
+)
+@click.option(
+    "--checkpoint",
+    type=int,
+    default=0,
+    help=(
+        "Save a snapshot to ./snapshots every this many timeslots, "
+        "0 saves no snapshots."
+    ),
+    show_default=True,
+)
+@click.option(
+    "--resume",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Resume the simulation from a snapshot.",
+)
+@click.option(
+    "--windows",
+    type=int,
+    default=1,
+    help="Split the horizon into this many time windows simulated in parallel.",
+    show_default=True,
+)
+@click.option(
+    "--warmup",
+    type=float,
+    default=24,
+    help="Warm-up period in hours simulated before each time window.",
+    show_default=True,
+)
+@click.option(
+    "--compare/--no-compare",
+    default=False,
+    help="Compare time windows with a sequential run, simulated alongside.",
+)
 def simulate(
-    ctx, ev_capacity, charging_speed, charging_strategy, industry_tariff, accuracy, risk
+    ctx,
+    ev_capacity,
+    charging_speed,
+    charging_strategy,
+    industry_tariff,
+    accuracy,
+    risk,
+    noise,
+    seed,
+    orderbook,
+    merit_order,
+    engine,
+    chunk_size,
+    chunk_format,
+    checkpoint,
+    resume,
+    windows,
+    warmup,
+    compare,
 ):
+    if windows > 1 and (chunk_size > 0 or checkpoint > 0 or resume):
+        raise click.UsageError(
+            "Time windows can not be streamed, checkpointed or resumed."
+        )
+
     click.echo("--- Simulation Settings: ---")
     click.echo("Debug is %s." % (ctx.obj["DEBUG"] and "on" or "off"))
     click.echo("Writing Logs to file is %s." % (ctx.obj["LOGS"] and "on" or "off"))
@@ -109,30 +227,66 @@ def simulate(
     click.echo("Charging strategy is set to %s" % charging_strategy)
     click.echo("Prediction accuracy is set to (%d%%, %d%%)." % accuracy)
     click.echo("Bidding risk is set to (%.2f, %.2f)." % risk)
-
-    if charging_strategy == "regular":
-        s = strategy.regular
-    elif charging_strategy == "balancing":
-        s = strategy.balancing
-    elif charging_strategy == "intraday":
-        s = strategy.intraday
-    elif charging_strategy == "integrated":
-        s = strategy.integrated
+    click.echo("Prediction noise is set to %s." % noise)
+    click.echo("Intraday order book is %s." % (orderbook and "on" or "off"))
+    click.echo("Balancing merit order is %s." % (merit_order and "on" or "off"))
+    click.echo("Simulation engine is set to %s." % engine)
+    if chunk_size > 0:
+        click.echo(
+            "Streaming results in chunks of %d timeslots (%s)."
+            % (chunk_size, chunk_format)
+        )
+    if windows > 1:
+        click.echo(
+            "Simulating %d time windows with %.1f hours warm-up." % (windows, warmup)
+        )
 
     cfg = SimulationConfig(
         ctx.obj["NAME"], charging_speed, ev_capacity, industry_tariff
     )
 
-    controller = Controller(cfg, s, accuracy=accuracy, risk=risk)
-    sim = Simulation(cfg, controller)
+    controller = Controller(
+        cfg,
+        charging_strategy,
+        accuracy=accuracy,
+        risk=risk,
+        noise=noise,
+        seed=seed,
+        orderbook=orderbook,
+        merit_order=merit_order,
+    )
+    click.echo("Prediction seed is set to %d." % controller.seed)
+    sim_class = engine_class(engine)
 
     click.echo("--- Starting Simulation: ---")
     start = time.time()
-    sim.start()
+    if windows > 1:
+        df_stats, df_results, df_sequential = partition(
+            cfg,
+            controller,
+            windows,
+            int(warmup * 60 * 60),
+            sim_class,
+            compare=compare,
+        )
+        for df, filename in [
+            (df_stats, "./logs/stats-%s.csv" % cfg.name),
+            (df_results, "./results/%s.csv" % cfg.name),
+        ]:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            df.round(2).to_csv(filename, index=False)
+        results = df_results.sum()
+    else:
+        sim = sim_class(cfg, controller, chunk_size, chunk_format)
+        if resume:
+            click.echo("Resuming simulation from %s." % resume)
+            sim.restore(Snapshot.load(resume))
+            click.echo("Prediction seed is restored to %d." % controller.seed)
+
+        sim.start(checkpoint)
+        results = sim.results.sum()
 
     click.echo("--- Simulation Results: ---")
-
-    results = sim.results.sum()
     click.echo("Energy charged as VPP: %.2fMWh" % (results.charged_vpp_kwh / 1000))
     click.echo(
         "Energy charged regularly: %.2fMWh" % (results.charged_regular_kwh / 1000)
@@ -146,6 +300,176 @@ def simulate(
         "Total lost rental costs: %.2fEUR (%d rentals)"
         % (results.lost_rentals_eur, results.lost_rentals_nb)
     )
+
+    if windows > 1 and compare:
+        df_divergence = divergence(df_results, df_sequential)
+        filename = "./results/%s-divergence.csv" % cfg.name
+        df_divergence.round(2).to_csv(filename)
+
+        click.echo("--- Divergence from sequential run: ---")
+        click.echo(df_divergence.round(2).to_string())
+        click.echo("Wrote divergence to %s" % filename)
+
+    click.echo("Elapsed time %.2f minutes" % ((time.time() - start) / 60))
+
+
+@cli.command(name="sweep", help="Simulate a grid of parameters in parallel.")
+@click.pass_context
+@click.option(
+    "-c",
+    "--ev-capacity",
+    default=17.6,
+    help="Battery capacity of EV in kWh.",
+    show_default=True,
+)
+@click.option(
+    "-s",
+    "--charging-speed",
+    default=3.6,
+    help="Charging power in kW.",
+    show_default=True,
+)
+@click.option(
+    "--charging-strategy",
+    type=click.Choice(strategy.names()),
+    multiple=True,
+    default=["integrated"],
+    help="Charging strategies, can be given multiple times.",
+    show_default=True,
+)
+@click.option(
+    "-i",
+    "--industry-tariff",
+    type=int,
+    multiple=True,
+    default=[150],
+    help="Industry tariffs, can be given multiple times.",
+    show_default=True,
+)
+@click.option(
+    "-a",
+    "--accuracy",
+    type=(int, int),
+    multiple=True,
+    default=[(100, 100)],
+    help="Prediction accuracies, can be given multiple times.",
+    show_default=True,
+)
+@click.option(
+    "-r",
+    "--risk",
+    type=(float, float),
+    multiple=True,
+    default=[(0.0, 0.0)],
+    help="Bidding risks, can be given multiple times.",
+    show_default=True,
+)
+@click.option(
+    "--risk-steps",
+    type=int,
+    help="Sweep all risk combinations of this many steps from 0 to 1 instead.",
+)
+@click.option(
+    "--noise",
+    type=click.Choice(NoiseModel.models),
+    default="uniform",
+    help="Error model of the capacity predictions.",
+    show_default=True,
+)
+@click.option(
+    "--seed",
+    type=int,
+    multiple=True,
+    default=[0],
+    help="Seeds of the prediction errors, can be given multiple times.",
+    show_default=True,
+)
+@click.option(
+    "--seeds",
+    type=int,
+    help="Repeat every run with this many seeds from 0 instead.",
+)
+@click.option(
+    "--orderbook/--no-orderbook",
+    default=False,
+    help="Clear intraday bids partially against the traded volume.",
+)
+@click.option(
+    "--merit-order/--no-merit-order",
+    default=False,
+    help="Activate balancing bids via the merit order of the tenders.",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(list(ENGINES)),
+    default="event",
+    help="Simulation engine of the runs.",
+    show_default=True,
+)
+@click.option(
+    "-p",
+    "--processes",
+    type=int,
+    help="Number of worker processes.  [default: number of CPUs]",
+)
+def sweep_grid(
+    ctx,
+    ev_capacity,
+    charging_speed,
+    charging_strategy,
+    industry_tariff,
+    accuracy,
+    risk,
+    risk_steps,
+    noise,
+    seed,
+    seeds,
+    orderbook,
+    merit_order,
+    engine,
+    processes,
+):
+    if risk_steps:
+        steps = np.linspace(0, 1, risk_steps).round(4).tolist()
+        risk = [(rb, ri) for rb in steps for ri in steps]
+    if seeds:
+        seed = list(range(seeds))
+
+    runs = grid(
+        ctx.obj["NAME"],
+        charging_strategy,
+        accuracy,
+        risk,
+        industry_tariff,
+        charging_speed,
+        ev_capacity,
+        seed,
+        noise,
+    )
+
+    click.echo("--- Sweep Settings: ---")
+    click.echo("Charging strategies: %s" % ", ".join(charging_strategy))
+    click.echo("Industry tariffs: %s" % ", ".join(map(str, industry_tariff)))
+    click.echo("Prediction accuracies: %d" % len(accuracy))
+    click.echo("Bidding risks: %d" % len(risk))
+    click.echo("Prediction noise: %s, %d seeds" % (noise, len(seed)))
+    click.echo("Intraday order book is %s." % (orderbook and "on" or "off"))
+    click.echo("Balancing merit order is %s." % (merit_order and "on" or "off"))
+    click.echo("Simulation engine is set to %s." % engine)
+    click.echo("Number of runs: %d" % len(runs))
+
+    sim_class = engine_class(engine)
+
+    click.echo("--- Starting Sweep: ---")
+    start = time.time()
+    df_summary = sweep(runs, sim_class, processes, orderbook, merit_order)
+
+    filename = "./results/%s-summary.csv" % ctx.obj["NAME"]
+    df_summary.round(2).to_csv(filename)
+
+    click.echo("--- Sweep Results: ---")
+    click.echo(df_summary.round(2).to_string())
+    click.echo("Wrote summary to %s" % filename)
     click.echo("Elapsed time %.2f minutes" % ((time.time() - start) / 60))
 
 
@@ -234,6 +558,18 @@ def intraday_prices():
     load.intraday_prices(rebuild=True)
 
 
+@build.command(help="(Re)build intraday trade data.")
+def intraday_trades():
+    click.echo("Rebuilding intraday trade data...")
+    load.intraday_trades(rebuild=True)
+
+
+@build.command(help="(Re)compile the binary store of capacity and price data.")
+def store():
+    click.echo("Compiling capacity and price store...")
+    market_series(rebuild=True)
+
+
 @build.command(help="(Re)build balancing price data.")
 def balancing_prices():
     click.echo("Rebuilding balanacing price data...")
@@ -244,7 +580,7 @@ def balancing_prices():
 @click.pass_context
 def controller(ctx):
     cfg = SimulationConfig()
-    c = Controller(cfg, strategy.intraday)
+    c = Controller(cfg, "intraday")
     ctx.obj["CONTROLLER"] = c
     return True
 
@@ -267,17 +603,17 @@ def bid(ctx, price, quantity, timeslot, market):
     controller = ctx.obj["CONTROLLER"]
 
     if market == "intraday":
-        market = controller.intraday
+        market = controller.intraday_market
     elif market == "balancing":
-        market = controller.balancing
+        market = controller.balancing_market
 
     try:
         ts = int(datetime.fromisoformat(timeslot).timestamp())
-        result = market.bid(ts, price, quantity)
-        if result:
+        bid = Bid(ts, price, quantity)
+        if market.place_bid(bid):
             click.echo(
-                "Succesful bid for %s at %.2fMWh/%.2fkW"
-                % (datetime.fromtimestamp(result[0]), result[2], result[1])
+                "Succesful bid for %s at %.2fEUR/MWh/%.2fkW"
+                % (datetime.fromtimestamp(bid.marketperiod), bid.price, bid.quantity)
             )
         else:
             click.echo("Bid unsuccessful! Try a higher price next time.")
@@ -1,2 +1,4 @@
 # flake8: noqa
 from .market import Bid, Market
+from .orderbook import OrderBook
+from .merit import MeritOrder
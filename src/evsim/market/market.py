@@ -1,5 +1,12 @@
 from dataclasses import dataclass
 from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from evsim.data import SlotSeries
+
+# Timezone of the delivery periods in the market data
+TIMEZONE = "Europe/Berlin"
 
 
 @dataclass(frozen=True)
@@ -10,9 +17,32 @@ class Bid:
 
 
 class Market:
-    def __init__(self, data):
+    """ Clearing prices of a market with 15-min delivery periods.
+
+    The prices are kept in a dense array indexed by 15-min period, NaN for
+    periods without data, so a lookup by POSIX timestamp is O(1). Delivery
+    periods in the data are local times of the market's timezone, not of the
+    machine running the simulation.
+    """
+
+    def __init__(self, data, tz=TIMEZONE):
         self.data = data
 
+        timestamps, found = _timestamps(data["product_time"], tz)
+        self.prices = SlotSeries(
+            timestamps, data["clearing_price_mwh"].values[found], 15 * 60
+        )
+
+    @classmethod
+    def from_series(cls, prices):
+        """ Market of a SlotSeries of clearing prices, e.g. from the store,
+        without price data frame.
+        """
+        market = cls.__new__(cls)
+        market.data = None
+        market.prices = prices
+        return market
+
     def place_bid(self, bid):
         """ Bid at intraday market given the price in EUR/MWh and quantity in kW
             at a given timeslot (POSIX timestamp).
@@ -20,24 +50,63 @@ class Market:
         """
 
         # NOTE: Simplified bidding behavior
-        cp = self.clearing_price(bid.marketperiod)
+        cp = self.prices.get(bid.marketperiod)
         if cp is None:
             return False
-        elif bid.price >= cp:
-            return True
+        return bool(bid.price >= cp)
+
+    def fill(self, bid):
+        """ Returns the quantity in kW cleared of a bid."""
+        return bid.quantity if self.place_bid(bid) else 0
+
+    def place_bids(self, marketperiods, prices, quantities):
+        """ Vectorised place_bid() for arrays of market periods (POSIX
+        timestamps), prices in EUR/MWh and quantities in kW.
+        Returns the mask of accepted bids and the cleared quantities in kW.
+        Bids at periods without clearing price are not accepted.
+        """
+        cp, found = self.prices.lookup(marketperiods)
+        accepted = found.copy()
+        accepted[found] = np.asarray(prices, dtype=np.float64)[found] >= cp[found]
+
+        cleared = np.where(accepted, np.asarray(quantities, dtype=np.float64), 0)
+        return accepted, cleared
 
     def clearing_price(self, timeslot):
         """ Get the clearing price for a 15-min contract at a given timeslot.
-        Takes a dataframe and timeslot (POSIX timestamp) as input.
+        Takes a timeslot (POSIX timestamp) as input.
         Returns the clearing price in EUR/MWh.
         """
-        # Market data has datetime format timeslots
-        dt = datetime.fromtimestamp(timeslot)
-        try:
-            return self.data.loc[
-                self.data["product_time"] == dt, "clearing_price_mwh"
-            ].iat[0]
-        except IndexError:
+        cp = self.prices.get(timeslot)
+        if cp is None:
             raise ValueError(
-                "Retrieving clearing price failed: %s is not in data." % dt
+                "Retrieving clearing price failed: %s is not in data."
+                % datetime.fromtimestamp(timeslot)
             )
+        return cp
+
+    def clearing_prices(self, timeslots):
+        """ Vectorised clearing_price() for an array of timeslots.
+        Returns the clearing prices in EUR/MWh, NaN if not in data.
+        """
+        prices, _ = self.prices.lookup(timeslots)
+        return prices
+
+
+def _timestamps(times, tz):
+    """ Returns the POSIX timestamps of local datetimes in a timezone and the
+    mask of the datetimes existing in the timezone.
+    """
+    # NOTE: Of the repeated hour at the end of DST, the first one is DST
+    dst = ~times.duplicated(keep="first").values
+    try:
+        local = times.dt.tz_localize(tz, ambiguous=dst, nonexistent="NaT")
+    except TypeError:
+        # pandas < 0.24
+        local = times.dt.tz_localize(tz, ambiguous=dst, errors="coerce")
+
+    found = local.notna().values
+    utc = local[found].dt.tz_convert("UTC").dt.tz_localize(None)
+    # NOTE: Datetimes are not always in ns, e.g. pandas >= 3 reads them in us
+    seconds = (utc - pd.Timestamp("1970-01-01")) // pd.Timedelta("1s")
+    return seconds.values.astype(np.int64), found
@@ -0,0 +1,179 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from evsim.data import SlotSeries
+from .market import TIMEZONE, Market, _timestamps
+
+
+class MeritOrder(Market):
+    """ Balancing market clearing via the merit order of the tenders.
+
+    Every tender period (from, to, HT/NT) keeps its negative control reserve
+    offers sorted by energy price, descending as the System Operator
+    activates them, with their cumulative allocated volume. Every 15-min
+    period references its tender and the volume activated in it.
+
+    A bid is placed in the merit order ahead of offers at the same price, it
+    is activated with the volume left over by the offers priced above it.
+    The clearing price of a period is the price of the marginal offer, as
+    calculated by balancing.calculate_clearing_prices(). Lookups are
+    searchsorted() over the cumulative volumes of all tenders.
+    """
+
+    def __init__(self, tender_results, activated_reserve, tz=TIMEZONE):
+        # We are only looking at negative control reserve
+        df = tender_results[tender_results["product_type"] == "NEG"]
+        df = df.sort_values(
+            ["product_time", "from", "to", "energy_price_mwh"],
+            ascending=[True, True, True, False],
+            kind="mergesort",
+        )
+
+        # Offers of all tenders, one after the other
+        sizes = df.groupby(["product_time", "from", "to"], sort=False).size()
+        self.tender_time = sizes.index.get_level_values(0).values
+        self.tender_from = sizes.index.get_level_values(1).values
+        self.tender_to = sizes.index.get_level_values(2).values
+        sizes = sizes.values
+        self.bounds = np.concatenate([[0], np.cumsum(sizes)])
+
+        self.offer_prices = df["energy_price_mwh"].values.astype(np.float64)
+        # Transform to kW
+        volumes = df["allocated_mw"].values.astype(np.float64) * 1000
+        self.cumulative = np.concatenate([[0], np.cumsum(volumes)])
+
+        # Offers keyed by tender first, then descending price, see _keys()
+        offer_tenders = np.repeat(np.arange(len(sizes)), sizes)
+        if len(self.offer_prices):
+            self.low = self.offer_prices.min() - 1
+            self.scale = self.offer_prices.max() - self.low + 1
+        else:
+            self.low, self.scale = 0, 1
+        self.keys = self._keys(offer_tenders, self.offer_prices)
+
+        # Tender and activated volume (kW) of every period
+        times = pd.to_datetime(activated_reserve["from"])
+        tender = self._tenders(times)
+        activated = activated_reserve["neg_mw"].values.astype(np.float64) * 1000
+        clearing_prices = self._prices(tender, activated, np.zeros(len(tender)))
+
+        super().__init__(
+            pd.DataFrame(
+                {"product_time": times, "clearing_price_mwh": clearing_prices},
+                columns=["product_time", "clearing_price_mwh"],
+            ),
+            tz,
+        )
+
+        timestamps, found = _timestamps(times, tz)
+        self.tenders = SlotSeries(timestamps, tender[found], 15 * 60)
+        self.activated = SlotSeries(timestamps, activated[found], 15 * 60)
+
+    def _tenders(self, times):
+        """ Returns the tender of every period, -1 if there is none."""
+        days = times.dt.normalize().values
+        # Find out product time
+        hours = times.dt.hour.values
+        product_time = np.where((8 <= hours) & (hours < 20), "HT", "NT")
+
+        tender = np.full(len(times), -1)
+        for t in np.unique(self.tender_time):
+            (ours,) = np.nonzero(self.tender_time == t)
+            (periods,) = np.nonzero(product_time == t)
+
+            # NOTE: Tenders of a product time are sorted by their start
+            k = np.searchsorted(self.tender_from[ours], days[periods], side="right") - 1
+            valid = k >= 0
+            valid[valid] = self.tender_to[ours[k[valid]]] >= days[periods[valid]]
+            tender[periods[valid]] = ours[k[valid]]
+        return tender
+
+    def _keys(self, tenders, prices):
+        """ Keys ascending by tender, then descending price."""
+        prices = np.clip(prices, self.low, self.low + self.scale - 1)
+        return tenders * self.scale + (self.low + self.scale - 1 - prices)
+
+    def _lookup(self, marketperiods):
+        """ Returns the tenders and activated volumes of market periods, and
+        the mask of periods with a tender.
+        """
+        tender, found = self.tenders.lookup(marketperiods)
+        activated, _ = self.activated.lookup(marketperiods)
+        found = found & (tender >= 0)
+        return np.where(found, tender, -1).astype(np.int64), activated, found
+
+    def _prices(self, tender, activated, quantities):
+        """ Price of the first offer at which the cumulative volume covers the
+        activated volume less the quantity, NaN where no such offer exists.
+        """
+        found = (tender >= 0) & (activated - quantities >= 0)
+        j = np.where(found, tender, 0)
+
+        first, end = self.bounds[j], self.bounds[j + 1]
+        k = np.searchsorted(
+            self.cumulative[1:],
+            self.cumulative[first] + activated - quantities,
+            side="left",
+        )
+        # NOTE: Beyond the merit order, every price is activated
+        k = np.clip(k, first, end - 1)
+        found = found & (end > first)
+
+        prices = np.full(len(j), np.nan)
+        prices[found] = self.offer_prices[k[found]]
+        return prices
+
+    def quantity_price(self, timeslot, quantity):
+        """ Returns the lowest price in EUR/MWh, at which a quantity in kW is
+        fully activated at a 15-min period.
+        """
+        price = self.quantity_prices([timeslot], [quantity])[0]
+        if np.isnan(price):
+            raise ValueError(
+                "Not enough control reserve activated for %.2fkW at %s."
+                % (quantity, datetime.fromtimestamp(timeslot))
+            )
+        return price
+
+    def quantity_prices(self, marketperiods, quantities):
+        """ Vectorised quantity_price() for arrays of market periods and
+        quantities. NaN where not enough control reserve was activated.
+        """
+        tender, activated, _ = self._lookup(marketperiods)
+        return self._prices(tender, activated, np.asarray(quantities, dtype=float))
+
+    def activations(self, marketperiods, prices, quantities):
+        """ Returns the volume in kW activated of bids at the market periods."""
+        tender, activated, found = self._lookup(marketperiods)
+        j = np.where(found, tender, 0)
+
+        # Volume of the offers priced above the bids
+        k = np.searchsorted(
+            self.keys,
+            self._keys(j, np.asarray(prices, dtype=np.float64)),
+            side="left",
+        )
+        k = np.clip(k, self.bounds[j], self.bounds[j + 1])
+        ahead = self.cumulative[k] - self.cumulative[self.bounds[j]]
+
+        volume = np.clip(activated - ahead, 0, np.asarray(quantities, dtype=float))
+        return np.where(found, volume, 0)
+
+    def place_bid(self, bid):
+        """ Bid at the market, returns if it is activated at least partially."""
+        return self.fill(bid) > 0
+
+    def fill(self, bid):
+        """ Returns the quantity in kW activated of a bid."""
+        _, cleared = self.place_bids([bid.marketperiod], [bid.price], [bid.quantity])
+        return cleared[0]
+
+    def place_bids(self, marketperiods, prices, quantities):
+        """ Vectorised place_bid() for arrays of market periods (POSIX
+        timestamps), prices in EUR/MWh and quantities in kW.
+        Returns the mask of (partially) activated bids and the activated
+        quantities in kW.
+        """
+        cleared = self.activations(marketperiods, prices, quantities)
+        return cleared > 0, cleared
@@ -0,0 +1,127 @@
+from datetime import datetime
+import numpy as np
+
+from .market import TIMEZONE, Market, _timestamps
+
+
+class OrderBook(Market):
+    """ Intraday market built from the individual trades, with limited
+    liquidity.
+
+    The trades are kept in arrays sorted by delivery period and price, with
+    the cumulative volume of every period. A bid buys the volume traded at
+    or below its price, so bids clear partially if they exceed it. The
+    lookups are binary searches over a key combining period and price.
+
+    The clearing price of a period is its lowest trade price, as in Market.
+    """
+
+    def __init__(self, trades, tz=TIMEZONE):
+        # Lowest trade price per period
+        prices = trades.groupby("product_time")["price_mwh"].min().reset_index()
+        prices.columns = ["product_time", "clearing_price_mwh"]
+        super().__init__(prices, tz)
+        self.trades = trades
+
+        timestamps, found = _timestamps(trades["product_time"], tz)
+        price = trades["price_mwh"].values[found].astype(np.float64)
+        # Transform to kW
+        volume = trades["quantity_mw"].values[found].astype(np.float64) * 1000
+
+        # NOTE: Periods index into the dense price series
+        period, r = np.divmod(timestamps - self.prices.start, self.prices.step)
+        price, volume, period = price[r == 0], volume[r == 0], period[r == 0]
+        order = np.lexsort((price, period))
+        self.trade_prices = price[order]
+        self.trade_periods = period[order]
+
+        # Cumulative volume before every trade and first trade of every period
+        self.cumulative = np.concatenate([[0], np.cumsum(volume[order])])
+        self.bounds = np.searchsorted(
+            self.trade_periods, np.arange(len(self.prices) + 1)
+        )
+
+        # Keys sorted by period first, then price, see _keys()
+        if len(price):
+            self.low, high = price.min() - 1, price.max()
+        else:
+            self.low, high = 0, 0
+        self.scale = high - self.low + 1
+        self.keys = self._keys(self.trade_periods, self.trade_prices)
+
+    def _keys(self, periods, prices):
+        """ Keys of prices at periods, prices beyond the traded ones clipped."""
+        prices = np.clip(prices, self.low, self.low + self.scale - 1)
+        return periods * self.scale + (prices - self.low)
+
+    def _periods(self, marketperiods):
+        """ Returns the period indices of market periods and the mask of
+        periods in the book.
+        """
+        i, r = np.divmod(
+            np.asarray(marketperiods, dtype=np.int64) - self.prices.start,
+            self.prices.step,
+        )
+        found = (r == 0) & (i >= 0) & (i < len(self.prices))
+        return np.where(found, i, 0), found
+
+    def volumes(self, marketperiods, prices):
+        """ Returns the volume in kW traded at or below the prices at the
+        market periods.
+        """
+        i, found = self._periods(marketperiods)
+        prices = np.asarray(prices, dtype=np.float64)
+
+        k = np.searchsorted(self.keys, self._keys(i, prices), side="right")
+        k = np.clip(k, self.bounds[i], self.bounds[i + 1])
+        return np.where(found, self.cumulative[k] - self.cumulative[self.bounds[i]], 0)
+
+    def quantity_price(self, timeslot, quantity):
+        """ Returns the lowest price in EUR/MWh, at which a quantity in kW
+        clears at a 15-min period.
+        """
+        price = self.quantity_prices([timeslot], [quantity])[0]
+        if np.isnan(price):
+            raise ValueError(
+                "Not enough volume traded for %.2fkW at %s."
+                % (quantity, datetime.fromtimestamp(timeslot))
+            )
+        return price
+
+    def quantity_prices(self, marketperiods, quantities):
+        """ Vectorised quantity_price() for arrays of market periods and
+        quantities. NaN where not enough volume was traded.
+        """
+        i, found = self._periods(marketperiods)
+        quantities = np.asarray(quantities, dtype=np.float64)
+
+        # First trade at which the cumulative volume covers the quantity
+        first = self.bounds[i]
+        k = np.searchsorted(
+            self.cumulative, self.cumulative[first] + quantities, side="left"
+        )
+        found = found & (k > first) & (k <= self.bounds[i + 1])
+
+        prices = np.full(len(i), np.nan)
+        prices[found] = self.trade_prices[k[found] - 1]
+        return prices
+
+    def place_bid(self, bid):
+        """ Bid at the market, returns if it cleared at least partially."""
+        return self.fill(bid) > 0
+
+    def fill(self, bid):
+        """ Returns the quantity in kW cleared of a bid."""
+        _, cleared = self.place_bids([bid.marketperiod], [bid.price], [bid.quantity])
+        return cleared[0]
+
+    def place_bids(self, marketperiods, prices, quantities):
+        """ Vectorised place_bid() for arrays of market periods (POSIX
+        timestamps), prices in EUR/MWh and quantities in kW.
+        Returns the mask of (partially) cleared bids and the cleared
+        quantities in kW, at most the volume traded at or below the price.
+        """
+        quantities = np.asarray(quantities, dtype=np.float64)
+        cleared = np.minimum(quantities, self.volumes(marketperiods, prices))
+        cleared = np.maximum(cleared, 0)
+        return cleared > 0, cleared
@@ -1,3 +1,12 @@
 # flake8: noqa
 from .statistic import Statistic, SimEntry, ResultEntry
+from .statistic import ChunkWriter, iter_chunks, read_chunks
+from .trips import Trip, TripIndex
+from .snapshot import PendingTrip, Snapshot
 from .simulation import Simulation, SimulationConfig
+from .vectorized import VectorizedSimulation
+from .event import EventSimulation
+from .engines import ENGINES, engine_class
+from .branch import Branch, fork
+from .sweep import SweepRun, grid, sweep
+from .partition import divergence, partition
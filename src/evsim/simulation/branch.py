@@ -0,0 +1,85 @@
+from dataclasses import dataclass, replace
+import logging
+import pandas as pd
+
+from .pool import fork_map, shared
+from evsim.controller import strategy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Branch:
+    """ What-if branch of a simulation. Strategy, risk and accuracy default
+    to the ones of the forked simulation. The strategy is given by the name
+    of a registered strategy.
+    """
+
+    name: str
+    strategy: str = None
+    risk: tuple = None
+    accuracy: tuple = None
+
+
+def fork(sim, branches, processes=None):
+    """ Continue a simulation from its current state in several branches.
+
+    The history up to now is simulated once. Every branch runs to the end in
+    its own worker process, which is forked from this one and so shares the
+    simulation state, trips and market data copy-on-write. Each branch writes
+    its stats and results under its own name.
+
+    Returns a DataFrame with the summed results of every branch.
+    """
+    # Load the market data once for all branches, if the forked simulation
+    # used the regular strategy so far.
+    controller = sim.controller
+    strategies = [b.strategy for b in branches if b.strategy is not None]
+    if not hasattr(controller, "fleet_capacity") and any(
+        strategy.get(s).bidding for s in strategies
+    ):
+        controller.load_data()
+
+    logger.info(
+        "Forking simulation %s into %d branches." % (sim.cfg.name, len(branches))
+    )
+    # NOTE: Workers run several branches on the same simulation, the branch
+    # settings are reset to the forked ones before every branch.
+    forked = (
+        sim.cfg,
+        controller.strategy,
+        controller.accuracy,
+        sim.stats.sink,
+        sim.results.sink,
+    )
+    summary = fork_map(
+        _run_branch,
+        range(len(branches)),
+        (sim, sim.snapshot(), forked, branches),
+        processes,
+    )
+    return pd.DataFrame(summary).set_index("name")
+
+
+def _run_branch(i):
+    sim, snapshot, forked, branches = shared()
+    forked_cfg, forked_strategy, forked_accuracy, stats_sink, results_sink = forked
+    branch = branches[i]
+    controller = sim.controller
+
+    cfg = replace(forked_cfg, name=branch.name)
+    sim.cfg = cfg
+    controller.cfg = cfg
+    controller.strategy = branch.strategy or forked_strategy
+    controller.accuracy = branch.accuracy or forked_accuracy
+
+    # Streamed chunks of the history are continued in the branch directories
+    if stats_sink is not None:
+        sim.stats.sink = stats_sink.copy("./logs/stats-%s" % cfg.name)
+        sim.results.sink = results_sink.copy("./results/%s" % cfg.name)
+
+    sim.restore(snapshot)
+    if branch.risk is not None:
+        controller.risk = branch.risk
+    sim.start()
+    return sim.summary()
@@ -0,0 +1,18 @@
+from .simulation import Simulation
+from .vectorized import VectorizedSimulation
+from .event import EventSimulation
+
+# Simulation engines by name
+ENGINES = {
+    "simpy": Simulation,
+    "vectorized": VectorizedSimulation,
+    "event": EventSimulation,
+}
+
+
+def engine_class(name):
+    """ Returns the simulation class of an engine by name."""
+    if name not in ENGINES:
+        raise ValueError("Unknown simulation engine: %s" % name)
+
+    return ENGINES[name]
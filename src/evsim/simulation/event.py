@@ -0,0 +1,68 @@
+import logging
+
+from . import ResultEntry, VectorizedSimulation
+
+logger = logging.getLogger(__name__)
+
+
+class EventSimulation(VectorizedSimulation):
+    """ Vectorized simulation engine that skips idle timeslots.
+
+    After each timeslot the engine determines the next timeslot in which the
+    state can change: A trip starts or ends, consumption is planned, the
+    strategy can bid or EVs in the VPP need to be charged. The timeslots in
+    between are fast-forwarded, their stats and results are constant and
+    added in one go.
+
+    NOTE: Skipped timeslots take the risk set at the last simulated timeslot.
+    """
+
+    def skip(self, timeslot, remaining):
+        """ Returns the number of following timeslots to fast-forward and adds
+        their stats and results.
+        """
+        timestep = 5 * 60
+
+        # EVs in the VPP are charged every timeslot
+        if remaining == 0 or len(self.vpp) > 0:
+            return 0
+
+        upcoming = [
+            self.trip_index.next_start(timeslot),
+            self.controller.next_planned(timeslot),
+            self.controller.next_decision(timeslot),
+        ]
+
+        # Trips are finished at the first timeslot after they ended
+        trip_end = self.vpp.next_trip_end()
+        if trip_end is not None:
+            upcoming.append(
+                timeslot + timestep * ((trip_end - timeslot) // timestep + 1)
+            )
+
+        upcoming = [t for t in upcoming if t is not None]
+        if upcoming:
+            skipped = min(remaining, (min(upcoming) - timeslot) // timestep - 1)
+        else:
+            skipped = remaining
+
+        if skipped <= 0:
+            return 0
+
+        logger.info("Fast-forwarding %d idle timeslots." % skipped)
+        timestamps = range(
+            timeslot + timestep, timeslot + timestep * (skipped + 1), timestep
+        )
+
+        rb, ri = self.controller.risk
+        self.stats.repeat(self.fleet_entry(timeslot), timestamps)
+        self.results.repeat(
+            ResultEntry(
+                charged_regular_kwh=0.0,
+                charged_vpp_kwh=0.0,
+                risk_bal=rb,
+                risk_intr=ri,
+            ),
+            timestamps,
+        )
+        return skipped
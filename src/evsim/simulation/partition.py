@@ -0,0 +1,126 @@
+from datetime import datetime
+import logging
+import pandas as pd
+
+from . import Simulation
+from .pool import fork_map, shared
+from evsim.controller import Controller, load_market_data
+from evsim.data import load
+
+logger = logging.getLogger(__name__)
+
+
+def partition(
+    cfg,
+    controller,
+    windows,
+    warmup=24 * 60 * 60,
+    sim_class=Simulation,
+    processes=None,
+    compare=False,
+):
+    """ Simulate the horizon split into time windows in parallel.
+
+    Every window starts with an empty fleet a warm-up period (seconds) before
+    the window, to let the fleet SoC, the VPP and the consumption plans
+    settle. Only the stats and results inside the windows are kept and
+    stitched together, so they approximate the ones of a sequential run.
+    Every window uses the strategy, accuracy, risk and prediction noise (model
+    and seed) of the given controller, so the windows and the sequential run
+    see the same forecast errors.
+
+    NOTE: Balancing bids are placed one week ahead, a shorter warm-up misses
+    the consumption plans bought before the window.
+
+    Returns the stitched stats and results, and with compare the results of
+    the sequential run simulated alongside (otherwise None).
+    """
+    trips = load.car2go_trips(False)
+    data = None
+    if controller.strategy.bidding:
+        data = load_market_data(controller.orderbook, controller.merit_order)
+
+    # Windows and warm-up periods start at timeslots of the sequential run
+    timestep = 5 * 60
+    start, end = int(trips.start_time.min()), int(trips.end_time.max())
+    num_timeslots = (end - start) // timestep + 1
+    bounds = [start + timestep * (num_timeslots * k // windows) for k in range(windows)]
+    bounds.append(end + 1)
+    warmup -= warmup % timestep
+
+    tasks = [(bounds[k], bounds[k + 1], warmup) for k in range(windows)]
+    if compare:
+        tasks.append(None)
+
+    logger.info(
+        "Simulating %d windows with %.1f hours warm-up." % (windows, warmup / 60 / 60)
+    )
+    frames = fork_map(
+        _run_window, tasks, (cfg, controller, trips, data, sim_class), processes
+    )
+
+    df_stats = pd.concat([s for s, _ in frames[:windows]], ignore_index=True)
+    df_results = pd.concat([r for _, r in frames[:windows]], ignore_index=True)
+    df_sequential = frames[-1][1] if compare else None
+    return df_stats, df_results, df_sequential
+
+
+def divergence(df_results, df_reference):
+    """ Compare stitched results with the results of a sequential run.
+
+    Returns the totals of both, their absolute and relative difference and
+    the maximal difference in a single timeslot for every result.
+    """
+    if (
+        len(df_results) != len(df_reference)
+        or (df_results.timestamp.values != df_reference.timestamp.values).any()
+    ):
+        raise ValueError("Results and reference cover different timeslots.")
+
+    columns = [
+        c for c in df_results.columns if c not in ["timestamp", "risk_bal", "risk_intr"]
+    ]
+    a, b = df_results[columns], df_reference[columns]
+    df = pd.DataFrame({"partitioned": a.sum(), "sequential": b.sum()})
+    df["difference"] = df.partitioned - df.sequential
+    df["difference_pct"] = 100 * df.difference / df.sequential.abs()
+    df["max_timeslot_difference"] = (a - b).abs().max()
+    df["timeslots_differing"] = ((a - b).abs() > 1e-6).sum()
+    return df
+
+
+def _run_window(window):
+    cfg, template, trips, data, sim_class = shared()
+
+    controller = Controller(
+        cfg,
+        template.strategy.name,
+        accuracy=template.accuracy,
+        risk=template.risk,
+        imbalance_costs=template.imbalance_costs,
+        data=data,
+        noise=template.noise_model,
+        seed=template.seed,
+        orderbook=template.orderbook,
+        merit_order=template.merit_order,
+    )
+
+    horizon = None
+    if window is not None:
+        start, end, warmup = window
+        first = int(trips.start_time.min())
+        horizon = (max(first, start - warmup), end - 1)
+        logger.info(
+            "Simulating window from %s to %s."
+            % (datetime.fromtimestamp(start), datetime.fromtimestamp(end))
+        )
+
+    sim = sim_class(cfg, controller, trips=trips, horizon=horizon)
+    while not sim.done:
+        sim.step()
+
+    df_stats, df_results = sim.stats.to_frame(), sim.results.to_frame()
+    if window is not None:
+        df_stats = df_stats[df_stats.timestamp >= start]
+        df_results = df_results[df_results.timestamp >= start]
+    return df_stats, df_results
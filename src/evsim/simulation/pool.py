@@ -0,0 +1,28 @@
+import multiprocessing
+
+# Data shared with the worker processes
+_shared = None
+
+
+def fork_map(func, tasks, shared, processes=None):
+    """ Map a function over tasks on a pool of worker processes.
+
+    The workers are forked from this process, so they share the given data
+    copy-on-write, e.g. trips, market data or a running simulation, instead
+    of receiving a pickled copy with every task. Workers read it with
+    shared(). Returns the results in the order of the tasks.
+    """
+    global _shared
+
+    _shared = shared
+    try:
+        # NOTE: Only forked workers share the parent's memory
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            return pool.map(func, tasks, chunksize=1)
+    finally:
+        _shared = None
+
+
+def shared():
+    """ Returns the data shared with the worker processes by fork_map()."""
+    return _shared
@@ -1,10 +1,12 @@
+import copy
 from dataclasses import dataclass
 from datetime import datetime
 import logging
 import pandas as pd
 import simpy
 
-from . import Statistic, SimEntry, ResultEntry
+from . import ChunkWriter, Statistic, SimEntry, ResultEntry, TripIndex
+from .snapshot import PendingTrip, Snapshot
 from evsim import entities
 from evsim.data import load
 
@@ -20,21 +22,59 @@ class SimulationConfig:
 
 
 class Simulation:
-    def __init__(self, cfg, controller):
+    def __init__(
+        self,
+        cfg,
+        controller,
+        chunk_size=0,
+        chunk_format="csv.gz",
+        trips=None,
+        horizon=None,
+    ):
 
         self.cfg = cfg
+        self.controller = controller
 
-        self.stats = Statistic()
-        self.results = Statistic()
+        # Trips can be loaded once and shared by several simulations
+        if trips is None:
+            trips = load.car2go_trips(False)
+        self.trips = trips
 
-        self.controller = controller
+        # Simulated time range, by default from the first to the last trip
+        if horizon is None:
+            horizon = (trips.start_time.min(), trips.end_time.max())
+        self.start_time, self.end_time = (int(t) for t in horizon)
 
-        self.trips = load.car2go_trips(False)
+        self.trip_index = TripIndex(self.trips)
 
-        self.env = simpy.Environment(initial_time=self.trips.start_time.min())
-        self.vpp = entities.VPP(
-            self.env, "VPP", len(self.trips.EV.unique()), cfg.charging_power
-        )
+        if chunk_size > 0:
+            # Stream stats and results to disk in chunks of timeslots
+            self.stats = Statistic(
+                SimEntry,
+                chunk_size,
+                ChunkWriter("./logs/stats-%s" % cfg.name, chunk_format),
+            )
+            self.results = Statistic(
+                ResultEntry,
+                chunk_size,
+                ChunkWriter("./results/%s" % cfg.name, chunk_format),
+            )
+        else:
+            # Preallocate one entry per timeslot
+            num_timeslots = len(self.timeslots())
+            self.stats = Statistic(SimEntry, num_timeslots)
+            self.results = Statistic(ResultEntry, num_timeslots)
+
+        self.init_env(self.start_time)
+        self.controller.prepare((self.start_time, self.end_time))
+
+        # Start lifecycle
+        self.env.process(self.lifecycle())
+
+    def init_env(self, initial_time):
+        self.env = simpy.Environment(initial_time=initial_time)
+        self.vpp = self.init_vpp()
+        self.fleet = self.init_fleet()
 
         self.done = False
 
@@ -42,14 +82,127 @@ class Simulation:
         self.controller.env = self.env
         self.controller.vpp = self.vpp
 
-        # Start lifecycle
+    def init_vpp(self):
+        return entities.VPP(
+            self.env,
+            "VPP",
+            len(self.trips.EV.unique()),
+            self.cfg.charging_power,
+            entities.Fleet(),
+        )
+
+    def init_fleet(self):
+        return self.vpp.fleet
+
+    def snapshot(self):
+        """ Returns the state of the simulation between two steps, without
+        changing it.
+        """
+        # NOTE: Finished trips of the fleet snapshot pay to a copy of the account
+        account = copy.copy(self.controller.account)
+        evs, vpp, trips = self.snapshot_fleet(account)
+        return Snapshot(
+            time=int(self.env.now),
+            evs=evs,
+            vpp=vpp,
+            trips=trips,
+            commited_capacity=self.vpp.commited_capacity,
+            balancing_plan=self.controller.balancing_plan.snapshot(),
+            intraday_plan=self.controller.intraday_plan.snapshot(),
+            account=account.snapshot(),
+            risk=self.controller.risk,
+            stats=self.stats.snapshot(),
+            results=self.results.snapshot(),
+            seed=self.controller.seed,
+            noise_model=self.controller.noise_model,
+        )
+
+    def restore(self, snapshot):
+        """ Continue the simulation from a snapshot. The simulation has to be
+        set up with the same configuration and trips.
+        """
+        logger.info(
+            "---- RESTORING SIMULATION: %s at %s -----"
+            % (self.cfg.name, datetime.fromtimestamp(snapshot.time))
+        )
+        self.init_env(snapshot.time)
+
+        self.controller.balancing_plan.restore(snapshot.balancing_plan)
+        self.controller.intraday_plan.restore(snapshot.intraday_plan)
+        self.controller.account.restore(snapshot.account)
+        self.controller.risk = snapshot.risk
+        # NOTE: Snapshots taken before the seed was kept continue with ours
+        if snapshot.seed is not None:
+            self.controller.set_noise(snapshot.noise_model, snapshot.seed)
+
+        self.stats.restore(snapshot.stats)
+        self.results.restore(snapshot.results)
+
+        # NOTE: Trips in progress have to be resumed before the lifecycle, to
+        # keep the order of simultaneous events.
+        self.restore_fleet(snapshot)
+        self.vpp.commited_capacity = snapshot.commited_capacity
         self.env.process(self.lifecycle())
 
-    def start(self):
+    def snapshot_fleet(self, account):
+        evs = [
+            (ev.name, ev.battery.level, ev.available, ev.charging)
+            for ev in self.fleet.evs.values()
+        ]
+        vpp = list(self.vpp.evs)
+
+        driving = sorted(
+            ev.trip + (ev.name,) for ev in self.fleet.evs.values() if ev.trip
+        )
+        trips = [
+            PendingTrip(end, name, rental, duration, charge, end_charger, price)
+            for end, _, rental, duration, charge, end_charger, price, name in driving
+        ]
+        return evs, vpp, trips
+
+    def restore_fleet(self, snapshot):
+        for name, soc, available, charging in snapshot.evs:
+            ev = entities.EV(
+                self.env,
+                self.fleet,
+                self.vpp,
+                name,
+                soc,
+                self.cfg.ev_capacity,
+                self.cfg.charging_power,
+            )
+            ev.available = available
+            ev.charging = charging
+
+        for name in snapshot.vpp:
+            self.vpp.add(self.fleet[name])
+
+        for trip in snapshot.trips:
+            self.env.process(
+                self.fleet[trip.EV].finish_trip(
+                    trip.end_time,
+                    trip.rental,
+                    trip.trip_duration,
+                    trip.trip_charge,
+                    trip.end_charging,
+                    trip.trip_price,
+                    account=self.controller.account,
+                )
+            )
+
+    def start(self, checkpoint=0):
+        """ Run the simulation until the end. With checkpoint, a snapshot is
+        saved every given number of steps to be able to resume the simulation.
+        """
         logger.info("---- STARTING SIMULATION: %s -----" % self.cfg.name)
+        steps = 0
         while not self.done:
             self.step()
 
+            steps += 1
+            if checkpoint > 0 and steps % checkpoint == 0:
+                self.snapshot().save("./snapshots/%s.pickle.gz" % self.cfg.name)
+
         logger.info("---- RESULTS: %s -----" % self.cfg.name)
 
         results = self.results.sum()
@@ -70,27 +223,55 @@ class Simulation:
         self.stats.write("./logs/stats-%s.csv" % self.cfg.name)
         self.results.write("./results/%s.csv" % self.cfg.name)
 
+    def summary(self):
+        """ Returns the settings and the summed results of the simulation"""
+        ab, ai = self.controller.accuracy
+        rb, ri = self.controller.risk
+        summary = {
+            "name": self.cfg.name,
+            "strategy": self.controller.strategy.name,
+            "industry_tariff": self.cfg.industry_tariff,
+            "accuracy_bal": ab,
+            "accuracy_intr": ai,
+            "risk_bal": rb,
+            "risk_intr": ri,
+            "noise": self.controller.noise_model,
+            "seed": self.controller.seed,
+        }
+        summary.update(self.results.sum().drop(["timestamp", "risk_bal", "risk_intr"]))
+        return summary
+
     def step(self, risk=None, minutes=5):
         if risk:
             self.controller.risk = risk
 
-        if self.env.peek() > self.trips.end_time.max():
+        if self.env.peek() > self.end_time:
             self.done = True
         else:
             self.env.run(until=(self.env.now + (60 * minutes)))
 
         return self.controller.account.balance, self.done
 
-    def lifecycle(self):
-        evs = {}
+    def next_timeslot(self):
+        """ Returns the next timeslot to simulate"""
+        return self.start_time + (5 * 60) * len(self.results)
 
-        # Timerange from start to end in 5 minute intervals
-        timeslots = pd.date_range(
-            datetime.utcfromtimestamp(self.trips.start_time.min()),
-            datetime.utcfromtimestamp(self.trips.end_time.max()),
+    def timeslots(self):
+        """ Timerange from start to end in 5 minute intervals"""
+        return pd.date_range(
+            datetime.utcfromtimestamp(self.start_time),
+            datetime.utcfromtimestamp(self.end_time),
             freq="5min",
         )
-        for _ in timeslots:
+
+    def lifecycle(self):
+        fleet = self.fleet
+
+        # Wait for the next timeslot, when restored from a snapshot
+        if self.next_timeslot() > self.env.now:
+            yield self.env.timeout(self.next_timeslot() - self.env.now)
+
+        for _ in range(len(self.timeslots()) - len(self.results)):
             logger.info(
                 "[%s] - ---------- TIMESLOT %s ----------"
                 % (
@@ -103,13 +284,12 @@ class Simulation:
             self.vpp.commited_capacity = self.controller.planned_kw(self.env.now)
 
             # 2. Find trips at the timeslot
-            starting_trips = self.trips.loc[self.trips["start_time"] == self.env.now]
-
-            for trip in starting_trips.itertuples():
+            for trip in self.trip_index.starting(self.env.now):
                 # 3. Add EVs to Fleet
-                if trip.EV not in evs:
-                    evs[trip.EV] = entities.EV(
+                if trip.EV not in fleet:
+                    entities.EV(
                         self.env,
+                        fleet,
                         self.vpp,
                         trip.EV,
                         trip.start_soc,
@@ -118,7 +298,7 @@ class Simulation:
                     )
 
                 # 4. Start trip with EV
-                ev = evs[trip.EV]
+                ev = fleet[trip.EV]
                 self.env.process(
                     ev.drive(
                         trip.Index,
@@ -137,66 +317,42 @@ class Simulation:
             self.stats.add(
                 SimEntry(
                     timestamp=self.env.now - 1,
-                    fleet_evs=len(evs),
-                    fleet_soc=self._fleet_soc(evs),
-                    available_evs=self._fleet_available(evs),
-                    charging_evs=self._fleet_charging(evs),
+                    fleet_evs=len(fleet),
+                    fleet_soc=fleet.avg_soc(),
+                    available_evs=fleet.available,
+                    charging_evs=fleet.charging,
                     vpp_soc=self.vpp.avg_soc(),
-                    vpp_evs=len(self.vpp.evs),
+                    vpp_evs=len(self.vpp),
                     vpp_charging_power_kw=self.vpp.capacity(),
                 )
             )
 
             # 6. Centrally control charging
-            p, vpp, r, i = self.controller.charge_fleet(self.env.now - 1)
-
-            # NOTE: Think of other way to pass rental costs back from EV
-            lost_rentals_eur = self.controller.account.lost_rental_eur
-            lost_rentals_nb = self.controller.account.lost_rental_nb
-            self.controller.account.lost_rental_reset()
-
-            rb, ri = self.controller.risk
-            self.results.add(
-                ResultEntry(
-                    timestamp=self.env.now - 1,
-                    profit_eur=p,
-                    lost_rentals_eur=lost_rentals_eur,
-                    lost_rentals_nb=lost_rentals_nb,
-                    charged_regular_kwh=r,
-                    charged_vpp_kwh=vpp,
-                    imbalance_kwh=i,
-                    risk_bal=rb,
-                    risk_intr=ri,
-                )
-            )
+            self.control(self.env.now - 1)
 
             # 7. Wait 5 min timestep
             yield self.env.timeout((5 * 60) - 1)
 
-    def _fleet_soc(self, evs):
-        if len(evs) == 0:
-            return 0
-
-        soc = 0
-        for ev in evs.values():
-            soc += ev.battery.level
-
-        return soc / len(evs)
-
-    def _fleet_available(self, evs):
-        if len(evs) == 0:
-            return 0
-        available = 0
-        for ev in evs.values():
-            if ev.available:
-                available += 1
-        return available
-
-    def _fleet_charging(self, evs):
-        if len(evs) == 0:
-            return 0
-        charging = 0
-        for ev in evs.values():
-            if ev.charging:
-                charging += 1
-        return charging
+    def control(self, timeslot):
+        """ Charge the fleet centrally and save the results of the timeslot"""
+        p, vpp, r, i = self.controller.charge_fleet(timeslot)
+
+        # NOTE: Think of other way to pass rental costs back from EV
+        lost_rentals_eur = self.controller.account.lost_rental_eur
+        lost_rentals_nb = self.controller.account.lost_rental_nb
+        self.controller.account.lost_rental_reset()
+
+        rb, ri = self.controller.risk
+        self.results.add(
+            ResultEntry(
+                timestamp=timeslot,
+                profit_eur=p,
+                lost_rentals_eur=lost_rentals_eur,
+                lost_rentals_nb=lost_rentals_nb,
+                charged_regular_kwh=r,
+                charged_vpp_kwh=vpp,
+                imbalance_kwh=i,
+                risk_bal=rb,
+                risk_intr=ri,
+            )
+        )
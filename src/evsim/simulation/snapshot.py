@@ -0,0 +1,57 @@
+from collections import namedtuple
+from dataclasses import dataclass
+from pathlib import Path
+import gzip
+import pickle
+
+PendingTrip = namedtuple(
+    "PendingTrip",
+    [
+        "end_time",
+        "EV",
+        "rental",
+        "trip_duration",
+        "trip_charge",
+        "end_charging",
+        "trip_price",
+    ],
+)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """ State of a simulation between two timesteps.
+
+    Holds only plain data and NumPy arrays, independent of the simulation
+    engine, so it can be pickled and restored by any engine.
+    """
+
+    # Simulation time (POSIX timestamp)
+    time: int
+    # EVs in the order they joined the fleet: (name, soc, available, charging)
+    evs: list
+    # Names of the EVs in the order they joined the VPP
+    vpp: list
+    # Trips in progress, in the order they end
+    trips: list
+    commited_capacity: float
+    balancing_plan: dict
+    intraday_plan: dict
+    account: dict
+    risk: tuple
+    stats: dict
+    results: dict
+    # Prediction noise, the distortions are regenerated from the seed
+    seed: int = None
+    noise_model: str = "uniform"
+
+    def save(self, filename):
+        filename = Path(filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(filename, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(filename):
+        with gzip.open(filename, "rb") as f:
+            return pickle.load(f)
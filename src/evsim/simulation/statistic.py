@@ -1,6 +1,8 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 from pathlib import Path
 import logging
+import shutil
+import numpy as np
 import pandas as pd
 
 logger = logging.getLogger(__name__)
@@ -9,7 +11,7 @@ logger = logging.getLogger(__name__)
 @dataclass(frozen=True)
 class SimEntry:
     timestamp: int = 0
-    fleet_evs: float = 0
+    fleet_evs: int = 0
     fleet_soc: float = 0
     available_evs: int = 0
     charging_evs: int = 0
@@ -32,20 +34,248 @@ class ResultEntry:
 
 
 class Statistic:
-    def __init__(self):
-        self.stats = list()
+    """ Columnar statistic of simulation entries.
+
+    Every field of the entry type is kept in a typed NumPy column. Columns are
+    preallocated for the expected number of entries, e.g. the number of
+    timeslots of a simulation, and grow when they are full.
+
+    With a sink, e.g. a ChunkWriter, the columns are a fixed-size buffer
+    instead: When full, the buffered entries are flushed to the sink.
+    """
+
+    def __init__(self, entry_type, size=0, sink=None):
+        self.entry_type = entry_type
+        self.fields = [f.name for f in fields(entry_type)]
+        self.columns = {
+            f.name: np.zeros(size, dtype=np.int64 if f.type is int else np.float64)
+            for f in fields(entry_type)
+        }
+        self.size = 0
+
+        self.sink = sink
+        if sink is not None and size < 1:
+            raise ValueError("Streaming statistics need a buffer size: %s" % size)
+
+        # Number and sums of entries already flushed to the sink
+        self.flushed = 0
+        self.flushed_sums = {name: 0 for name in self.fields}
+
+    def __len__(self):
+        return self.flushed + self.size
 
     def add(self, entry):
-        self.stats.append(asdict(entry))
+        self._reserve(1)
+        for name in self.fields:
+            self.columns[name][self.size] = getattr(entry, name)
+        self.size += 1
+
+    def repeat(self, entry, timestamps):
+        """ Add copies of an entry for several timestamps"""
+        n = len(timestamps)
+
+        # Never grow the buffer beyond its size when streaming
+        buffer_size = len(self.columns["timestamp"])
+        if self.sink is not None and n > buffer_size:
+            for i in range(0, n, buffer_size):
+                self.repeat(entry, timestamps[i : i + buffer_size])
+            return
+
+        self._reserve(n)
+        for name in self.fields:
+            self.columns[name][self.size : self.size + n] = getattr(entry, name)
+        self.columns["timestamp"][self.size : self.size + n] = timestamps
+        self.size += n
 
     def sum(self):
-        df_stats = pd.DataFrame(data=self.stats)
-        return df_stats.sum()
+        return pd.Series(
+            {
+                name: self.flushed_sums[name] + self.columns[name][: self.size].sum()
+                for name in self.fields
+            }
+        )
+
+    def flush(self):
+        """ Write the buffered entries to the sink and clear the buffer"""
+        if self.sink is None or self.size == 0:
+            return
+
+        for name in self.fields:
+            self.flushed_sums[name] += self.columns[name][: self.size].sum()
+        self.sink.write(self.to_frame().round(2))
+
+        self.flushed += self.size
+        self.size = 0
+
+    def snapshot(self):
+        """ Returns the entries and flushed sums as plain data"""
+        return {
+            "columns": {
+                name: self.columns[name][: self.size].copy() for name in self.fields
+            },
+            "flushed": self.flushed,
+            "flushed_sums": dict(self.flushed_sums),
+            "chunks": self.sink.chunks if self.sink is not None else 0,
+        }
+
+    def restore(self, state):
+        """ Replace the entries by the ones of a snapshot"""
+        columns = state["columns"]
+        n = len(columns["timestamp"])
+
+        self.size = 0
+        if n > len(self.columns["timestamp"]):
+            for name, column in self.columns.items():
+                self.columns[name] = np.resize(column, n)
+
+        for name in self.fields:
+            self.columns[name][:n] = columns[name]
+        self.size = n
+
+        self.flushed = state["flushed"]
+        self.flushed_sums = dict(state["flushed_sums"])
+        if self.sink is not None:
+            self.sink.restore(state["chunks"])
+
+    def to_frame(self):
+        """ Returns the entries in memory as DataFrame"""
+        return pd.DataFrame(
+            {name: self.columns[name][: self.size] for name in self.fields},
+            columns=self.fields,
+        )
 
     def write(self, filename):
+        """ Write all entries into one CSV file. Returns the entries as
+        DataFrame, when streaming None, as they are only kept on disk: Read
+        them from the file or with read_chunks().
+        """
         filename = Path(filename)
         filename.parent.mkdir(parents=True, exist_ok=True)
-        df_stats = pd.DataFrame(data=self.stats)
+
+        # Concatenate the chunks chunk by chunk, to keep the memory bounded
+        if self.sink is not None:
+            self.flush()
+            self.sink.to_csv(filename)
+            return None
+
+        df_stats = self.to_frame()
         df_stats = df_stats.round(2)
         df_stats.to_csv(filename, index=False)
         return df_stats
+
+    def _reserve(self, n):
+        """ Grow the columns (or flush the buffer) to fit n more entries"""
+        capacity = len(self.columns["timestamp"])
+        if self.size + n <= capacity:
+            return
+
+        if self.sink is not None:
+            self.flush()
+            return
+
+        capacity = max(self.size + n, 2 * capacity)
+        for name, column in self.columns.items():
+            self.columns[name] = np.resize(column, capacity)
+
+
+class ChunkWriter:
+    """ Writes chunks of a statistic as numbered files into a directory.
+
+    Supported formats are gzip compressed CSV and, if pyarrow is installed,
+    Parquet and Feather.
+    """
+
+    formats = ["csv.gz", "parquet", "feather"]
+
+    def __init__(self, directory, fmt="csv.gz"):
+        if fmt not in self.formats:
+            raise ValueError("Unknown chunk format: %s" % fmt)
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fmt = fmt
+        self.chunks = 0
+
+        # NOTE: Chunks of a previous run with the same name are removed with
+        # the first write, so a restored simulation can continue them.
+        self.stale = True
+
+    def restore(self, chunks):
+        """ Continue after the first chunks, e.g. when restored from a snapshot"""
+        self.chunks = chunks
+        self.stale = True
+
+    def write(self, df):
+        if self.stale:
+            for path in _chunk_files(self.directory):
+                if _chunk_number(path) >= self.chunks:
+                    path.unlink()
+            self.stale = False
+
+        path = self.path(self.chunks)
+        if self.fmt == "csv.gz":
+            df.to_csv(path, index=False, compression="gzip")
+        elif self.fmt == "parquet":
+            df.to_parquet(path)
+        elif self.fmt == "feather":
+            df.to_feather(path)
+
+        self.chunks += 1
+        logger.debug("Wrote chunk %s" % path)
+
+    def copy(self, directory):
+        """ Returns a writer for another directory, which continues after a
+        copy of the chunks written so far.
+        """
+        writer = ChunkWriter(directory, self.fmt)
+        for i in range(self.chunks):
+            shutil.copyfile(self.path(i), writer.path(i))
+        writer.restore(self.chunks)
+        return writer
+
+    def path(self, chunk):
+        return self.directory / ("part-%05d.%s" % (chunk, self.fmt))
+
+    def to_csv(self, filename):
+        """ Concatenate all chunks into one CSV file, one chunk at a time"""
+        with open(filename, "w") as f:
+            for i in range(self.chunks):
+                df = _read_chunk(self.path(i))
+                df.to_csv(f, header=(i == 0), index=False)
+
+
+def iter_chunks(directory):
+    """ Iterates over the chunks written by a ChunkWriter in order"""
+    for path in _chunk_files(Path(directory)):
+        yield _read_chunk(path)
+
+
+def read_chunks(directory):
+    """ Reads the chunks written by a ChunkWriter back into one DataFrame"""
+    chunks = list(iter_chunks(directory))
+    if not chunks:
+        raise FileNotFoundError("No chunks found in %s" % directory)
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _read_chunk(path):
+    if path.name.endswith(".csv.gz"):
+        return pd.read_csv(path)
+    elif path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    elif path.suffix == ".feather":
+        return pd.read_feather(path)
+
+
+def _chunk_files(directory):
+    """ Returns the chunk files of a directory, ordered by their number."""
+    # NOTE: Numbers are zero-padded to 5 digits, beyond they are longer
+    paths = [p for p in directory.glob("part-*") if _chunk_number(p) is not None]
+    return sorted(paths, key=_chunk_number)
+
+
+def _chunk_number(path):
+    """ Returns the number of a chunk file, None if it is not one."""
+    number = path.name[len("part-") :].split(".")[0]
+    return int(number) if number.isdigit() else None
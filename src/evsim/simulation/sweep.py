@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+import itertools
+import logging
+import pandas as pd
+
+from . import Simulation, SimulationConfig
+from .pool import fork_map, shared
+from evsim.controller import Controller, load_market_data, strategy
+from evsim.data import load
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SweepRun:
+    cfg: SimulationConfig
+    # Name of a registered strategy
+    strategy: str
+    accuracy: tuple
+    risk: tuple
+    noise: str = "uniform"
+    seed: int = 0
+
+
+def grid(
+    name,
+    strategies,
+    accuracies,
+    risks,
+    industry_tariffs,
+    charging_power=3.6,
+    ev_capacity=17.6,
+    seeds=(0,),
+    noise="uniform",
+):
+    """ Returns a run for every combination of the parameters, named after
+    the sweep and the number of the run. Several seeds repeat every run with
+    other prediction errors, e.g. for a Monte Carlo simulation.
+    """
+    runs = list()
+    combinations = itertools.product(
+        strategies, accuracies, risks, industry_tariffs, seeds
+    )
+    for i, (s, accuracy, risk, tariff, seed) in enumerate(combinations):
+        cfg = SimulationConfig("%s-%d" % (name, i), charging_power, ev_capacity, tariff)
+        runs.append(SweepRun(cfg, s, accuracy, risk, noise, seed))
+
+    return runs
+
+
+def sweep(
+    runs, sim_class=Simulation, processes=None, orderbook=False, merit_order=False
+):
+    """ Simulate the runs on a pool of worker processes.
+
+    Trips and market data are loaded once up front, with orderbook the
+    intraday market with limited liquidity and with merit_order the
+    quantity-dependent balancing market. The workers are forked,
+    so they share the data read-only instead of loading it for every run.
+
+    Returns a DataFrame with the settings and summed results of every run.
+    """
+    trips = load.car2go_trips(False)
+    data = None
+    if any(strategy.get(run.strategy).bidding for run in runs):
+        data = load_market_data(orderbook, merit_order)
+
+    logger.info("Sweeping %d simulation runs." % len(runs))
+    summary = fork_map(
+        _run,
+        range(len(runs)),
+        (runs, sim_class, trips, data, orderbook, merit_order),
+        processes,
+    )
+    return pd.DataFrame(summary).set_index("name")
+
+
+def _run(i):
+    runs, sim_class, trips, data, orderbook, merit_order = shared()
+    run = runs[i]
+
+    controller = Controller(
+        run.cfg,
+        run.strategy,
+        accuracy=run.accuracy,
+        risk=run.risk,
+        data=data,
+        noise=run.noise,
+        seed=run.seed,
+        orderbook=orderbook,
+        merit_order=merit_order,
+    )
+    sim = sim_class(run.cfg, controller, trips=trips)
+    sim.start()
+    return sim.summary()
@@ -0,0 +1,72 @@
+from collections import namedtuple
+import numpy as np
+
+Trip = namedtuple(
+    "Trip",
+    [
+        "Index",
+        "EV",
+        "start_soc",
+        "end_soc",
+        "trip_duration",
+        "end_charging",
+        "trip_price",
+    ],
+)
+
+
+class TripIndex:
+    """ Slot-keyed index of the trip data.
+
+    The trips are sorted once by start time into column arrays. For every
+    timeslot between the first and the last trip the index keeps the offsets
+    of the trips starting at that timeslot, so a lookup does not have to
+    scan the whole trip data.
+    """
+
+    def __init__(self, df_trips, timestep=5 * 60):
+        # NOTE: Stable sort keeps the original trip order within a timeslot
+        order = np.argsort(df_trips["start_time"].values, kind="mergesort")
+
+        self.start_time = df_trips["start_time"].values[order]
+        self.columns = [df_trips.index.values[order]] + [
+            df_trips[c].values[order] for c in Trip._fields[1:]
+        ]
+
+        self.timestep = timestep
+        self.start = int(df_trips["start_time"].min())
+        self.end = int(df_trips["end_time"].max())
+
+        # Offsets of the trips of every timeslot in the sorted arrays
+        timeslots = np.arange(self.start, self.end + 1, timestep)
+        self.lo = np.searchsorted(self.start_time, timeslots, side="left")
+        self.hi = np.searchsorted(self.start_time, timeslots, side="right")
+
+    def __len__(self):
+        return len(self.start_time)
+
+    def offsets(self, timeslot):
+        """ Returns the offsets of the trips starting at a given timeslot.
+        Timeslots off the 5-min grid or outside the trip data have no trips.
+        """
+        i, r = divmod(timeslot - self.start, self.timestep)
+        if r != 0 or i < 0 or i >= len(self.lo):
+            return 0, 0
+
+        return self.lo[i], self.hi[i]
+
+    def next_start(self, timeslot):
+        """ Returns the first start time of a trip after a given timeslot."""
+        i = np.searchsorted(self.start_time, timeslot, side="right")
+        if i == len(self.start_time):
+            return None
+
+        return int(self.start_time[i])
+
+    def starting(self, timeslot):
+        """ Returns the trips starting at a given timeslot (POSIX timestamp)."""
+        lo, hi = self.offsets(timeslot)
+        if lo == hi:
+            return []
+
+        return [Trip(*t) for t in zip(*(c[lo:hi].tolist() for c in self.columns))]
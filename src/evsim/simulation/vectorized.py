@@ -0,0 +1,150 @@
+from datetime import datetime
+import logging
+import numpy as np
+
+from . import SimEntry, Simulation
+from .snapshot import PendingTrip
+from evsim import entities
+
+logger = logging.getLogger(__name__)
+
+
+class VectorizedSimulation(Simulation):
+    """ Simulation engine operating on an array-backed FleetState.
+
+    EVs are not simulated as separate SimPy processes, instead the lifecycle
+    starts and finishes the trips of every timeslot on the FleetState and the
+    controller charges the VPP in vectorised steps. Produces the same
+    simulation stats and results as the SimPy engine.
+    """
+
+    def init_vpp(self):
+        return entities.FleetState(
+            self.env,
+            "VPP",
+            len(self.trips.EV.unique()),
+            self.cfg.ev_capacity,
+            self.cfg.charging_power,
+        )
+
+    def init_fleet(self):
+        return self.vpp
+
+    def snapshot_fleet(self, account):
+        # NOTE: Finish the trips which already ended like the SimPy engine, on
+        # a copy of the fleet, the lifecycle does so at the next timeslot.
+        fleet = self.fleet.copy()
+        fleet.end_trips(self.env.now, account)
+        n = fleet.fleet_evs()
+        evs = list(
+            zip(
+                fleet.names,
+                fleet.soc[:n].tolist(),
+                fleet.available[:n].tolist(),
+                fleet.charging[:n].tolist(),
+            )
+        )
+
+        members = np.flatnonzero(fleet.vpp)
+        members = members[np.argsort(fleet.vpp_order[members])]
+        vpp = [fleet.names[i] for i in members]
+
+        trips = [
+            PendingTrip(
+                end, fleet.names[i], rental, duration, charge, end_charger, price
+            )
+            for end, _, i, charge, end_charger, price, rental, duration in (
+                fleet.pending_trips()
+            )
+        ]
+        return evs, vpp, trips
+
+    def restore_fleet(self, snapshot):
+        fleet = self.fleet
+        for name, soc, available, charging in snapshot.evs:
+            i = fleet.add_ev(name, soc)
+            fleet.available[i] = available
+            fleet.charging[i] = charging
+
+        for name in snapshot.vpp:
+            fleet.add(fleet.ids[name])
+
+        for trip in snapshot.trips:
+            fleet.resume_trip(
+                trip.end_time,
+                fleet.ids[trip.EV],
+                trip.rental,
+                trip.trip_duration,
+                trip.trip_charge,
+                trip.end_charging,
+                trip.trip_price,
+            )
+
+    def lifecycle(self):
+        fleet = self.fleet
+        account = self.controller.account
+
+        # Wait for the next timeslot, when restored from a snapshot
+        if self.next_timeslot() > self.env.now:
+            yield self.env.timeout(self.next_timeslot() - self.env.now)
+
+        remaining = len(self.timeslots()) - len(self.results)
+        while remaining > 0:
+            logger.info(
+                "[%s] - ---------- TIMESLOT %s ----------"
+                % (
+                    datetime.fromtimestamp(self.env.now),
+                    datetime.fromtimestamp(self.env.now),
+                )
+            )
+
+            # 1. Finish trips that ended in the last timeslot
+            fleet.end_trips(self.env.now, account)
+
+            # 2. Allocate consumption plan
+            fleet.commited_capacity = self.controller.planned_kw(self.env.now)
+
+            # 3. Find trips at the timeslot
+            for trip in self.trip_index.starting(self.env.now):
+                # 4. Add EVs to Fleet
+                if not fleet.contains_ev(trip.EV):
+                    fleet.add_ev(trip.EV, trip.start_soc)
+
+                # 5. Start trip with EV
+                fleet.start_trip(trip, account)
+
+            # NOTE: Wait 1 sec like the SimPy engine
+            yield self.env.timeout(1)
+
+            # 6. Save simulation stats
+            self.stats.add(self.fleet_entry(self.env.now - 1))
+
+            # 7. Centrally control charging
+            self.control(self.env.now - 1)
+            remaining -= 1
+
+            # 8. Fast-forward timeslots in which nothing happens
+            skipped = self.skip(self.env.now - 1, remaining)
+            remaining -= skipped
+
+            # 9. Wait 5 min timestep
+            yield self.env.timeout((5 * 60) * (1 + skipped) - 1)
+
+    def fleet_entry(self, timestamp):
+        fleet = self.fleet
+        return SimEntry(
+            timestamp=timestamp,
+            fleet_evs=fleet.fleet_evs(),
+            fleet_soc=fleet.fleet_soc(),
+            available_evs=fleet.fleet_available(),
+            charging_evs=fleet.fleet_charging(),
+            vpp_soc=fleet.avg_soc(),
+            vpp_evs=len(fleet),
+            vpp_charging_power_kw=fleet.capacity(),
+        )
+
+    def skip(self, timeslot, remaining):
+        """ Returns the number of following timeslots to fast-forward.
+        The vectorized engine simulates every timeslot.
+        """
+        return 0
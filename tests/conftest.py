@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from evsim.data import SlotSeries
+from evsim.market import Market
+
+# 2017-01-01 00:00 in Europe/Berlin
+START = 1483225200
+HOURS = 6
+
+
+@pytest.fixture
+def trips():
+    """ Random trips of a small fleet over a few hours."""
+    rng = np.random.RandomState(0)
+    rows = list()
+    for ev in range(10):
+        t = START + 5 * 60 * rng.randint(0, 12)
+        while t < START + HOURS * 60 * 60:
+            duration = 5 * int(rng.randint(1, 6))
+            soc = rng.uniform(40, 90)
+            rows.append(
+                {
+                    "EV": "ev%d" % ev,
+                    "start_time": t,
+                    "end_time": t + duration * 60,
+                    "start_soc": soc,
+                    "end_soc": soc - rng.uniform(0, 10),
+                    "trip_duration": duration,
+                    "end_charging": int(rng.rand() < 0.7),
+                    "trip_price": duration * 0.3,
+                }
+            )
+            t += (duration + 5 * int(rng.randint(6, 30))) * 60
+
+    df = pd.DataFrame(rows).sort_values("start_time", kind="mergesort")
+    return df.reset_index(drop=True)
+
+
+@pytest.fixture
+def market_data():
+    """ Random capacity and prices, covering a week of balancing lead time."""
+    rng = np.random.RandomState(0)
+    timestamps = np.arange(START - 60 * 60, START + (HOURS + 9 * 24) * 60 * 60, 5 * 60)
+    capacity = SlotSeries(timestamps, rng.uniform(20, 60, len(timestamps)), 5 * 60)
+
+    periods = pd.date_range(
+        "2016-12-31 23:00", periods=(HOURS + 9 * 24) * 4, freq="15min"
+    )
+
+    def market():
+        prices = rng.uniform(0, 250, len(periods))
+        return Market(
+            pd.DataFrame({"product_time": periods, "clearing_price_mwh": prices})
+        )
+
+    return capacity, capacity.rolling_min(3), market(), market()
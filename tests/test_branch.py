@@ -0,0 +1,24 @@
+import pandas as pd
+
+from evsim.controller import Controller
+from evsim.simulation import Branch, Simulation, SimulationConfig, fork
+
+
+def test_branches_do_not_depend_on_pool_size(trips, market_data, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    cfg = SimulationConfig("test")
+    controller = Controller(
+        cfg, "integrated", accuracy=(80, 80), data=market_data, seed=1
+    )
+    sim = Simulation(cfg, controller, trips=trips)
+    for _ in range(12):
+        sim.step(minutes=15)
+
+    branches = [Branch("x", strategy="intraday", accuracy=(100, 100)), Branch("y")]
+    sequential = fork(sim, branches, processes=1)
+    parallel = fork(sim, branches, processes=2)
+
+    pd.testing.assert_frame_equal(sequential, parallel)
+    assert sequential.loc["y", "strategy"] == "integrated"
+    assert sequential.loc["y", "accuracy_bal"] == 80
@@ -0,0 +1,26 @@
+import numpy as np
+
+from evsim.controller import Controller
+from evsim.controller.noise import CAPACITY
+from evsim.envs.fleet_env import FleetEnv
+from evsim.simulation import Simulation, SimulationConfig
+
+
+def test_episodes_predict_with_other_noise(trips, market_data, monkeypatch):
+    def init_sim(env):
+        cfg = SimulationConfig("test")
+        env.controller = Controller(
+            cfg, "integrated", accuracy=env.accuracy, data=market_data, seed=1
+        )
+        env.sim = Simulation(cfg, env.controller, trips=trips)
+
+    monkeypatch.setattr(FleetEnv, "init_sim", init_sim)
+    monkeypatch.setattr(FleetEnv, "save_results", lambda env, filename: None)
+    env = FleetEnv()
+
+    env.reset()
+    first = env.controller.noise.array(70, CAPACITY).copy()
+    env.reset()
+    second = env.controller.noise.array(70, CAPACITY)
+
+    assert not np.array_equal(first, second)
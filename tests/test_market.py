@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+
+from evsim.market import Market
+
+# 2017-01-01 00:00 in Europe/Berlin
+START = 1483225200
+
+
+@pytest.mark.parametrize("unit", ["ns", "us", "s"])
+def test_market_timestamps_of_any_datetime_unit(unit):
+    times = pd.Series(pd.date_range("2017-01-01", periods=4, freq="15min"))
+    market = Market(
+        pd.DataFrame(
+            {
+                "product_time": times.astype("datetime64[%s]" % unit),
+                "clearing_price_mwh": [10.0, 20.0, 30.0, 40.0],
+            }
+        )
+    )
+
+    assert market.prices.start == START
+    assert market.clearing_price(START + 15 * 60) == 20.0
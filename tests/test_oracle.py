@@ -0,0 +1,19 @@
+import warnings
+
+import numpy as np
+
+from evsim.controller.oracle import BALANCING, INTRADAY, NONE, Oracle
+
+
+def test_oracle_buys_from_the_cheaper_market():
+    capacity = np.array([40.0, 40.0, 40.0, 0.0, 40.0])
+    balancing = np.array([50.0, np.nan, 200.0, 10.0, np.nan])
+    intraday = np.array([80.0, 100.0, np.nan, 10.0, np.nan])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        market, quantity, profit = Oracle.solve(capacity, balancing, intraday, 150)
+
+    assert list(market) == [BALANCING, INTRADAY, NONE, NONE, NONE]
+    assert list(quantity) == [40, 40, 0, 0, 0]
+    np.testing.assert_allclose(profit, [1.0, 0.5, 0, 0, 0])
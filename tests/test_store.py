@@ -0,0 +1,27 @@
+import numpy as np
+
+from evsim.data import SlotSeries, store
+
+
+def series(value):
+    return {"capacity": SlotSeries(np.arange(0, 3000, 300), np.full(10, value), 300)}
+
+
+def test_store_keeps_the_replaced_and_unindexed_versions(tmp_path):
+    compiling = tmp_path / "v-compiling"
+    compiling.mkdir()
+
+    for value in range(4):
+        store.save(tmp_path, series(value))
+    assert store.load(tmp_path)["capacity"].get(300) == 3
+
+    versions = sorted(p.name for p in tmp_path.glob("v-*"))
+    assert len(versions) == 3
+    assert compiling.name in versions
+
+
+def test_store_is_not_outdated_without_sources(tmp_path):
+    assert store.outdated(tmp_path, [tmp_path / "missing.csv"])
+
+    store.save(tmp_path, series(1))
+    assert not store.outdated(tmp_path, [tmp_path / "missing.csv"])
@@ -0,0 +1,32 @@
+from evsim.controller import Controller
+from evsim.controller.strategy import market_strategy
+from evsim.simulation import Simulation, SimulationConfig
+
+
+def test_market_strategy_keeps_bids_without_quantity(trips, market_data):
+    cfg = SimulationConfig("test")
+    controller = Controller(cfg, "intraday", data=market_data, seed=1)
+    sim = Simulation(cfg, controller, trips=trips)
+
+    # Capacity already committed beyond the predicted one
+    market = controller.intraday_market
+    market_period = next(
+        t
+        for t in range(sim.start_time + 30 * 60, sim.end_time, 15 * 60)
+        if market.clearing_price(t) <= cfg.industry_tariff
+    )
+    controller.balancing_plan.add(market_period, 1000)
+
+    profit = market_strategy(
+        controller,
+        market,
+        controller.intraday_plan,
+        market_period - 30 * 60,
+        30 * 60,
+        0,
+        100,
+    )
+
+    quantity = controller.intraday_plan.get(market_period)
+    assert quantity < 0
+    assert profit < 0